@@ -1,38 +1,47 @@
-from flask import Flask
-from flask_login import LoginManager
-from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
-from config import Config
-from dotenv import load_dotenv
-
-
-load_dotenv()  # Add this line
-db = SQLAlchemy()
-login_manager = LoginManager()
-
-def create_app(config_class=Config):
-    app = Flask(__name__)
-    app.config.from_object(config_class)
-    app.secret_key = 'your_secret_key'  # Needed for session to work
-
-    CORS(app, supports_credentials=True)
-    db.init_app(app)
-    login_manager.init_app(app)
-    login_manager.login_view = 'auth.login'
-    
-    from app.routes import main_bp
-    from app.auth import auth_bp
-    app.register_blueprint(main_bp)
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    
-    with app.app_context():
-        db.create_all()
-        config_class.init_app(app)
-    
-    return app
-
-from app.models import User
-
-@login_manager.user_loader
-def load_user(user_id):
+import time
+import multiprocessing
+from flask import Flask
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+from flask_cors import CORS
+from config import Config
+from dotenv import load_dotenv
+
+
+load_dotenv()  # Add this line
+db = SQLAlchemy()
+login_manager = LoginManager()
+
+def create_app(config_class=Config):
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    app.secret_key = 'your_secret_key'  # Needed for session to work
+
+    CORS(app, supports_credentials=True)
+    db.init_app(app)
+    login_manager.init_app(app)
+    login_manager.login_view = 'auth.login'
+    
+    from app.routes import main_bp
+    from app.auth import auth_bp
+    app.register_blueprint(main_bp)
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    
+    with app.app_context():
+        db.create_all()
+        config_class.init_app(app)
+    
+    from app.utils.lazy_imports import record_create_app, start_warm_up
+    record_create_app(time.perf_counter() - started)
+    # Pool workers (render, time series) that build an app must not warm up or start pools of their own
+    if app.config['WARM_UP_ON_START'] and multiprocessing.parent_process() is None:
+        start_warm_up(app)
+    
+    return app
+
+from app.models import User
+
+@login_manager.user_loader
+def load_user(user_id):
     return User.query.get(int(user_id))
\ No newline at end of file
@@ -1,57 +1,57 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
-from flask_login import login_user, logout_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
-from app.models import User
-from app import db
-
-auth_bp = Blueprint('auth', __name__)
-
-@auth_bp.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        email = request.form.get('email')
-        password = request.form.get('password')
-        remember = True if request.form.get('remember') else False
-        
-        user = User.query.filter_by(email=email).first()
-        
-        if not user or not check_password_hash(user.password, password):
-            flash('Please check your login details and try again.')
-            return redirect(url_for('auth.login'))
-            
-        login_user(user, remember=remember)
-        return redirect(url_for('main.index'))
-        
-    return render_template('auth/login.html')
-
-@auth_bp.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        email = request.form.get('email')
-        name = request.form.get('name')
-        password = request.form.get('password')
-        
-        user = User.query.filter_by(email=email).first()
-        
-        if user:
-            flash('Email address already exists')
-            return redirect(url_for('auth.register'))
-            
-        new_user = User(
-            email=email,
-            name=name,
-            password=generate_password_hash(password, method='sha256')
-        )
-        
-        db.session.add(new_user)
-        db.session.commit()
-        
-        return redirect(url_for('auth.login'))
-        
-    return render_template('auth/register.html')
-
-@auth_bp.route('/logout')
-@login_required
-def logout():
-    logout_user()
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_user, logout_user, login_required
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.models import User
+from app import db
+
+auth_bp = Blueprint('auth', __name__)
+
+@auth_bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        email = request.form.get('email')
+        password = request.form.get('password')
+        remember = True if request.form.get('remember') else False
+        
+        user = User.query.filter_by(email=email).first()
+        
+        if not user or not check_password_hash(user.password, password):
+            flash('Please check your login details and try again.')
+            return redirect(url_for('auth.login'))
+            
+        login_user(user, remember=remember)
+        return redirect(url_for('main.index'))
+        
+    return render_template('auth/login.html')
+
+@auth_bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        email = request.form.get('email')
+        name = request.form.get('name')
+        password = request.form.get('password')
+        
+        user = User.query.filter_by(email=email).first()
+        
+        if user:
+            flash('Email address already exists')
+            return redirect(url_for('auth.register'))
+            
+        new_user = User(
+            email=email,
+            name=name,
+            password=generate_password_hash(password, method='sha256')
+        )
+        
+        db.session.add(new_user)
+        db.session.commit()
+        
+        return redirect(url_for('auth.login'))
+        
+    return render_template('auth/register.html')
+
+@auth_bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
     return redirect(url_for('main.home'))
\ No newline at end of file
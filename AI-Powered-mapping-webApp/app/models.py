@@ -1,8 +1,8 @@
-from flask_login import UserMixin
-from . import db
-
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(100),  unique=True, nullable=False)
-    password = db.Column(db.String(100))
+from flask_login import UserMixin
+from . import db
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(100),  unique=True, nullable=False)
+    password = db.Column(db.String(100))
     name = db.Column(db.String(1000))
\ No newline at end of file
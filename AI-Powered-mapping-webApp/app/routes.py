@@ -1,129 +1,460 @@
-from flask import Blueprint, request, jsonify, session, current_app, render_template, redirect, url_for
-from werkzeug.utils import secure_filename
-import os
-import geopandas as gpd
-import pandas as pd
-from flask_login import login_required, current_user
-from app.utils.ai_handler import process_user_query
-from app.utils.map_generator import generate_map_response
-from app.utils.style_parser import parse_style_instructions
-from app.utils.file_processor import process_uploaded_file
-from app.utils.raster_processor import calculate_index, create_raster_visualization
-import rasterio
-import zipfile
-import traceback
-
-main_bp = Blueprint('main', __name__)
-
-@main_bp.route('/')
-def home():
-    return render_template('home.html')
-
-@main_bp.route('/gis')
-@login_required
-def index():
-    return render_template('gis/index.html')
-
-@main_bp.route('/api/process-query', methods=['POST'])
-@login_required
-def process_query():
-    data = request.get_json()
-    user_message = data.get('message', '')
-    
-    try:
-        if 'current_geojson' not in session or 'gdf_columns' not in session:
-            return jsonify({
-                'ai_response': 'Please upload a GeoJSON file first! 📁',
-                'requires_file': True
-            }), 400
-                
-        gdf = gpd.read_file(session['current_geojson'])
-        columns = session.get('gdf_columns', [])
-        
-        ai_response, column_names = process_user_query(
-            user_message, 
-            columns,
-            current_app.config['GENAI_API_KEY']
-        )
-        
-        response_data = {'ai_response': ai_response}
-        
-        if column_names:
-            if any(keyword in user_message.lower() for keyword in ['map', 'visualize', 'heatmap']):
-                styles = parse_style_instructions(user_message)
-                map_data = generate_map_response(gdf, column_names, styles, user_message)
-                response_data.update(map_data)
-            
-            if any(keyword in user_message.lower() for keyword in ['statistics', 'stats', 'plot', 'chart']):
-                stats = {}
-                for col in column_names:
-                    if pd.api.types.is_numeric_dtype(gdf[col]):
-                        stats[col] = gdf[col].describe().to_dict()
-                    else:
-                        stats[col] = f"Statistics not available for non-numeric column: {col}"
-                response_data['statistics'] = stats
-        
-        return jsonify(response_data)
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@main_bp.route('/api/upload-file', methods=['POST'])
-@login_required
-def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file selected'}), 400
-
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-
-    try:
-        filename = secure_filename(file.filename)
-        upload_dir = current_app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_dir, exist_ok=True)
-        filepath = os.path.join(upload_dir, filename)
-        file.save(filepath)
-
-        # Simple file type detection
-        if filename.lower().endswith(('.geojson', '.json')):
-            gdf = gpd.read_file(filepath)
-            session['current_geojson'] = filepath
-            session['gdf_columns'] = list(gdf.columns)
-            return jsonify({
-                'message': 'File uploaded successfully',
-                'file_type': 'vector',
-                'columns': list(gdf.columns)
-            })
-        elif filename.lower().endswith(('.tif', '.tiff')):
-            return jsonify({
-                'message': 'Raster file uploaded',
-                'file_type': 'raster',
-                'filepath': filepath
-            })
-        else:
-            return jsonify({'error': 'Unsupported file type'}), 400
-
-    except Exception as e:
-        current_app.logger.error(f"Upload error: {str(e)}")
-        return jsonify({'error': f'File processing error: {str(e)}'}), 500
-    
-def calculate_raster_index():
-    data = request.get_json()
-    
-    try:
-        index_data = calculate_index(
-            data['raster_path'],
-            data['index_type'],
-            data['bands']
-        )
-        
-        image_data = create_raster_visualization(index_data, data['index_type'])
-        
-        return jsonify({
-            'index_type': data['index_type'],
-            'image_data': image_data
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 400
\ No newline at end of file
+from flask import Blueprint, request, jsonify, session, current_app, render_template, redirect, url_for, Response, stream_with_context
+from werkzeug.utils import secure_filename
+import os
+from flask_login import login_required, current_user
+from app.utils.intent_parser import parse_intent, classify_request, parser_stats
+from app.utils.style_parser import parse_style_instructions
+from app.utils.query_parser import parse_attribute_filters, parse_bbox, FilterError
+from app.utils import render_cache, intent_cache, render_jobs
+from app.utils.lazy_imports import lazy_module, lazy_functions, startup_report
+
+# Subsystems built on pandas/geopandas, rasterio, matplotlib/folium and the Gemini SDK are
+# imported on first use, so workers boot and serve the pages and auth routes without them
+pd = lazy_module('pandas')
+geometry_lod = lazy_module('app.utils.geometry_lod')
+vector_tiles = lazy_module('app.utils.vector_tiles')
+raster_tiles = lazy_module('app.utils.raster_tiles')
+index_cache = lazy_module('app.utils.index_cache')
+process_user_query = lazy_functions('app.utils.ai_handler', 'process_user_query')
+llm_stats = lazy_functions('app.utils.llm_client', 'llm_stats')
+generate_map_response, map_columns, create_index_tile_map = lazy_functions(
+    'app.utils.map_generator', 'generate_map_response', 'map_columns', 'create_index_tile_map'
+)
+process_uploaded_file, store_vector_dataset, dataset_id = lazy_functions(
+    'app.utils.file_processor', 'process_uploaded_file', 'store_vector_dataset', 'dataset_id'
+)
+load_dataset, cache_stats = lazy_functions('app.utils.dataset_cache', 'load_dataset', 'cache_stats')
+load_profile, write_profile, describe_column = lazy_functions(
+    'app.utils.column_profile', 'load_profile', 'write_profile', 'describe_column'
+)
+index_label = lazy_functions('app.utils.band_math', 'index_label')
+zonal_statistics = lazy_functions('app.utils.zonal_stats', 'zonal_statistics')
+start_timeseries_job, job_status = lazy_functions(
+    'app.utils.raster_timeseries', 'start_timeseries_job', 'job_status'
+)
+calculate_index_preview, create_raster_visualization, index_legend, index_statistics, export_index = lazy_functions(
+    'app.utils.raster_processor',
+    'calculate_index_preview', 'create_raster_visualization', 'index_legend', 'index_statistics', 'export_index'
+)
+import zipfile
+import traceback
+
+main_bp = Blueprint('main', __name__)
+
+# Time-series job ids remembered per session (the status of older ones can no longer be polled)
+MAX_SESSION_TIMESERIES_JOBS = 20
+
+@main_bp.route('/')
+def home():
+    return render_template('home.html')
+
+@main_bp.route('/gis')
+@login_required
+def index():
+    return render_template('gis/index.html')
+
+def resolve_intent(message, columns, profile=None):
+    """
+    (ai_response, column_names) for a chat message.
+
+    Map and statistics requests naming a column are resolved locally; everything else
+    is answered from the intent cache when possible and by the model otherwise. The
+    dataset's column ``profile``, when given, informs both.
+    """
+    result = parse_intent(message, columns, profile)
+    if result is not None:
+        return result
+    # Prompts quote the profile's values, so answers are only shared by identical profiles
+    key = intent_cache.intent_key(message, columns, profile['fingerprint'] if profile else None)
+    result = intent_cache.get_intent(key)
+    if result is None:
+        result = process_user_query(message, columns, current_app.config['GENAI_API_KEY'], profile)
+        # Failed calls are retried next time rather than remembered
+        if not result[0].startswith('AI Error:'):
+            intent_cache.put_intent(key, result)
+    return result
+
+def query_events(user_message, columns, dataset_path, wait_for_map=True):
+    """
+    Answer a chat message in stages, yielding (event, payload) pairs as each is ready.
+
+    The model's text comes first, then statistics, then the rendered map, so a
+    streaming client can show the text while the map is still being drawn. An
+    'ai_response' event may be repeated when a later stage amends the text.
+
+    With RENDER_WORKERS set, the map is rendered by the background job queue: a
+    'map_job' event carries the job id as soon as it is queued, and unless
+    ``wait_for_map`` is False the 'map' event follows when the job finishes.
+
+    Unfiltered statistics are read from the profile written at upload, so without a
+    map to draw in this process the dataset is not loaded at all.
+    """
+    profile = load_profile(dataset_path)
+    ai_response, column_names = resolve_intent(user_message, columns, profile)
+    yield 'ai_response', {'ai_response': ai_response}
+
+    if not column_names:
+        return
+    request_type = classify_request(user_message)
+    wants_map, wants_stats = request_type['map'], request_type['stats']
+    if not (wants_map or wants_stats):
+        return
+
+    # Load geometry plus only the columns this request touches, filtered at read time
+    needed_columns = list(dict.fromkeys(column_names + map_columns(column_names, columns)))
+    where = parse_attribute_filters(user_message, columns)
+    bbox = parse_bbox(user_message)
+    profiled = (profile is not None and not where and bbox is None
+                and all(col in profile['columns'] for col in column_names))
+    render_queued = wants_map and current_app.config['RENDER_WORKERS'] > 0
+    gdf = None
+    if profiled and (render_queued or not wants_map):
+        empty = profile['rows'] == 0
+    else:
+        gdf = load_dataset(dataset_path, columns=needed_columns, where=where, bbox=bbox)
+        empty = gdf.empty
+    if empty:
+        yield 'ai_response', {'ai_response': f"{ai_response}\n\nNo features match the requested filter."}
+        return
+
+    job_id = None
+    if wants_map:
+        styles = parse_style_instructions(user_message)
+        if render_queued:
+            # Queued first, so the render overlaps the statistics below
+            job_id = render_jobs.submit_render(
+                dataset_path, column_names, needed_columns, where, bbox, styles, user_message,
+                owner=current_user.id
+            )
+            yield 'map_job', {'map_job': job_id}
+
+    if wants_stats:
+        stats = {}
+        for col in column_names:
+            if profiled:
+                col_stats = describe_column(profile['columns'][col])
+            elif pd.api.types.is_numeric_dtype(gdf[col]):
+                col_stats = gdf[col].describe().to_dict()
+            else:
+                col_stats = None
+            stats[col] = col_stats if col_stats is not None else f"Statistics not available for non-numeric column: {col}"
+        yield 'statistics', {'statistics': stats}
+
+    if wants_map:
+        if job_id is None:
+            yield 'map', generate_map_response(gdf, column_names, styles, user_message)
+        elif wait_for_map:
+            yield 'map', render_jobs.wait_for_render(job_id)
+
+@main_bp.route('/api/process-query', methods=['POST'])
+@login_required
+def process_query():
+    data = request.get_json()
+    user_message = data.get('message', '')
+    
+    try:
+        if 'current_geojson' not in session or 'gdf_columns' not in session:
+            return jsonify({
+                'ai_response': 'Please upload a GeoJSON file first! 📁',
+                'requires_file': True
+            }), 400
+                
+        columns = session.get('gdf_columns', [])
+        
+        # "async": true returns the map job id at once instead of waiting for the render
+        response_data = {}
+        events = query_events(user_message, columns, session['current_geojson'], wait_for_map=not data.get('async'))
+        for _, payload in events:
+            response_data.update(payload)
+        
+        return jsonify(response_data)
+    
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/process-query/stream', methods=['POST'])
+@login_required
+def process_query_stream():
+    """
+    Streaming variant of process-query as Server-Sent Events.
+
+    Emits 'ai_response', 'map_job', 'statistics' and 'map' events as the stages finish
+    (their data is the JSON the plain endpoint would merge into one response), then
+    'done', or 'error' if a stage fails.
+    """
+    data = request.get_json()
+    user_message = data.get('message', '')
+
+    if 'current_geojson' not in session or 'gdf_columns' not in session:
+        return jsonify({
+            'ai_response': 'Please upload a GeoJSON file first! 📁',
+            'requires_file': True
+        }), 400
+
+    # Read the session up front: it cannot change once the response has started
+    columns = session.get('gdf_columns', [])
+    dataset_path = session['current_geojson']
+
+    def sse(event, payload):
+        # Same encoder as jsonify, so payloads match the plain endpoint
+        return f"event: {event}\ndata: {current_app.json.dumps(payload)}\n\n"
+
+    def generate():
+        try:
+            for event, payload in query_events(user_message, columns, dataset_path):
+                yield sse(event, payload)
+            yield sse('done', {})
+        except Exception as e:
+            yield sse('error', {'error': str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@main_bp.route('/api/render-jobs/<job_id>')
+@login_required
+def get_render_job(job_id):
+    job = render_jobs.job_status(job_id)
+    # Other users' jobs are reported as unknown rather than forbidden
+    if job is None or job['owner'] != str(current_user.id):
+        return jsonify({'error': 'Unknown render job'}), 404
+    return jsonify(job)
+
+@main_bp.route('/api/startup-report')
+@login_required
+def get_startup_report():
+    return jsonify(startup_report())
+
+@main_bp.route('/api/upload-file', methods=['POST'])
+@login_required
+def upload_file():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file selected'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+
+    try:
+        result = process_uploaded_file(file)
+
+        if result['file_type'] == 'vector':
+            session['current_geojson'] = result['filepath']
+            session['gdf_columns'] = result['columns']
+            return jsonify({
+                'message': result['message'],
+                'file_type': 'vector',
+                'columns': result['columns']
+            })
+        else:
+            session['current_raster'] = result['filepath']
+            return jsonify(result)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Upload error: {str(e)}")
+        return jsonify({'error': f'File processing error: {str(e)}'}), 500
+
+@main_bp.route('/api/cache-stats')
+@login_required
+def get_cache_stats():
+    return jsonify({
+        'datasets': cache_stats(),
+        'renders': render_cache.cache_stats(),
+        'simplification': geometry_lod.cache_stats(),
+        'vector_tiles': vector_tiles.cache_stats(),
+        'raster_tiles': raster_tiles.cache_stats(),
+        'raster_indices': index_cache.cache_stats(),
+        'llm': llm_stats(),
+        'intents': intent_cache.cache_stats(),
+        'local_intents': parser_stats(),
+        'render_jobs': render_jobs.job_stats()
+    })
+
+@main_bp.route('/tiles/<dataset>/<int:z>/<int:x>/<int:y>.pbf')
+@login_required
+def vector_tile(dataset, z, x, y):
+    # Tiles are only served for the dataset in the user's own session
+    path = session.get('current_geojson')
+    if path is None or dataset_id(path) != dataset or not vector_tiles.valid_tile(z, x, y):
+        return jsonify({'error': 'Tile not found'}), 404
+
+    columns = [col for col in request.args.get('columns', '').split(',') if col]
+    unknown = set(columns) - set(session.get('gdf_columns', []))
+    if unknown:
+        return jsonify({'error': f"Unknown columns: {', '.join(sorted(unknown))}"}), 400
+
+    try:
+        tile = vector_tiles.get_tile(path, z, x, y, columns)
+    except Exception as e:
+        current_app.logger.error(f"Tile error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    return Response(tile, mimetype='application/vnd.mapbox-vector-tile',
+                    headers={'Cache-Control': 'private, max-age=3600'})
+
+@main_bp.route('/raster-tiles/<raster>/<path:index_type>/<int:z>/<int:x>/<int:y>.png')
+@login_required
+def raster_tile(raster, index_type, z, x, y):
+    # Like vector tiles, only the raster in the user's own session is served
+    path = session.get('current_raster')
+    if path is None or dataset_id(path) != raster or not vector_tiles.valid_tile(z, x, y):
+        return jsonify({'error': 'Tile not found'}), 404
+
+    try:
+        # Custom expressions name their bands themselves, so the list may be empty
+        bands = [int(band) for band in request.args.get('bands', '').split(',') if band]
+        tile = raster_tiles.get_raster_tile(path, index_type, bands, z, x, y)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Raster tile error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    return Response(tile, mimetype='image/png',
+                    headers={'Cache-Control': 'private, max-age=3600'})
+
+def _is_uploaded_file(path):
+    """Only files inside the upload folder may be processed on behalf of a client"""
+    upload_dir = os.path.realpath(current_app.config['UPLOAD_FOLDER'])
+    return os.path.commonpath([upload_dir, os.path.realpath(path)]) == upload_dir
+
+@main_bp.route('/api/calculate-index', methods=['POST'])
+@login_required
+def calculate_raster_index():
+    data = request.get_json()
+    
+    try:
+        if not _is_uploaded_file(data['raster_path']):
+            return jsonify({'error': 'Unknown raster file'}), 400
+
+        # Previews come from overviews; full resolution only for statistics and export
+        mode = data.get('mode', 'preview')
+        if mode not in ('preview', 'statistics', 'export'):
+            return jsonify({'error': f"Unknown mode: {mode}"}), 400
+
+        if mode == 'preview':
+            index_data = calculate_index_preview(
+                data['raster_path'],
+                data['index_type'],
+                data['bands']
+            )
+            image_data = create_raster_visualization(index_data, data['index_type'])
+            response = {
+                'index_type': data['index_type'],
+                'image_data': image_data,
+                'legend': index_legend(data['index_type'])
+            }
+            if data['raster_path'] == session.get('current_raster'):
+                # Pan and zoom at native resolution through the raster tile endpoint
+                tile_url = raster_tiles.raster_tile_url_template(
+                    dataset_id(data['raster_path']), data['index_type'], data['bands']
+                )
+                response['tile_url'] = tile_url
+                response['map_html'] = create_index_tile_map(
+                    tile_url, raster_tiles.raster_bounds(data['raster_path']), data['index_type']
+                )
+            return jsonify(response)
+
+        index_data = index_cache.get_index(
+            data['raster_path'],
+            data['index_type'],
+            data['bands']
+        )
+
+        if mode == 'statistics':
+            return jsonify({
+                'index_type': data['index_type'],
+                'statistics': index_statistics(index_data)
+            })
+        else:  # export
+            stem = os.path.splitext(os.path.basename(data['raster_path']))[0]
+            out_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{stem}_{index_label(data['index_type'])}.tif")
+            return jsonify({
+                'index_type': data['index_type'],
+                'filepath': export_index(data['raster_path'], index_data, out_path)
+            })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@main_bp.route('/api/zonal-statistics', methods=['POST'])
+@login_required
+def calculate_zonal_statistics():
+    data = request.get_json()
+
+    try:
+        if not _is_uploaded_file(data['raster_path']):
+            return jsonify({'error': 'Unknown raster file'}), 400
+        if 'current_geojson' not in session:
+            return jsonify({'error': 'Please upload a vector layer with the zones first'}), 400
+
+        path = session['current_geojson']
+        zones = load_dataset(path)
+        stats = zonal_statistics(
+            data['raster_path'],
+            data['index_type'],
+            data.get('bands', []),
+            zones,
+            percentiles=data.get('percentiles', (10, 50, 90))
+        )
+
+        # Keep the statistics as columns of the session layer so they can be mapped and queried
+        enriched = zones.drop(columns=[col for col in stats.columns if col in zones.columns]).join(stats)
+        stem = dataset_id(path)
+        if not stem.endswith('_zonal'):
+            stem += '_zonal'
+        output_path = store_vector_dataset(
+            enriched, os.path.join(current_app.config['UPLOAD_FOLDER'], f"{stem}.parquet")
+        )
+        write_profile(output_path, enriched)
+        session['current_geojson'] = output_path
+        session['gdf_columns'] = list(enriched.columns)
+
+        return jsonify({
+            'message': f"Added {', '.join(stats.columns)} for {len(stats)} zones",
+            'columns': list(enriched.columns),
+            'added_columns': list(stats.columns)
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@main_bp.route('/api/timeseries', methods=['POST'])
+@login_required
+def start_timeseries():
+    data = request.get_json()
+
+    try:
+        # A scene is one raster path or a list of single-band files
+        scenes = data['rasters']
+        paths = [path for scene in scenes for path in ([scene] if isinstance(scene, str) else scene)]
+        if not all(_is_uploaded_file(path) for path in paths):
+            return jsonify({'error': 'Unknown raster file'}), 400
+
+        job_id = start_timeseries_job(
+            scenes,
+            data['index_type'],
+            data.get('bands', []),
+            os.path.join(current_app.config['UPLOAD_FOLDER'], 'timeseries'),
+            times=data.get('times')
+        )
+        # The session cookie keeps only the most recent jobs
+        session['timeseries_jobs'] = (session.get('timeseries_jobs', []) + [job_id])[-MAX_SESSION_TIMESERIES_JOBS:]
+        return jsonify({'job_id': job_id}), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@main_bp.route('/api/timeseries/<job_id>')
+@login_required
+def timeseries_status(job_id):
+    status = job_status(job_id) if job_id in session.get('timeseries_jobs', []) else None
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
\ No newline at end of file
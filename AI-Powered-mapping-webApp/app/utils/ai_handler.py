@@ -1,105 +1,183 @@
-import google.generativeai as genai
-from flask import current_app
-
-def process_user_query(message, columns, api_key):
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
-        prompt = f"""
-        You are a GIS visualization assistant. Analyze this user query and determine:
-        1. Is it a general question about GIS concepts?
-        2. Is it a request for a specific action (map, stats, etc)?
-        3. What parameters are needed for the action?
-        4. For data explanation: brief, friendly with emojis
-        
-        Available columns: {columns}
-        
-        Examples:
-        - "What is NDVI?" → GENERAL
-        - "Show me a map of population" → ACTION:MAP (column=population)
-        - "Calculate statistics for income" → ACTION:STATS (column=income)
-        - "Add a scale bar to the map" → ACTION:MAP_ELEMENT (element=scale_bar)
-        
-        Respond in this format:
-        TYPE: [GENERAL|ACTION:type]
-        RESPONSE: [your response]
-        PARAMS: [key=value, ...] (if applicable)
-        
-        User query: {message}
-        """
-        
-        response = model.generate_content(prompt)
-        response_text = response.text
-        
-        if "TYPE: GENERAL" in response_text:
-            return response_text.split("RESPONSE:")[1].strip(), None
-        elif "TYPE: ACTION:" in response_text:
-            action_type = response_text.split("TYPE: ACTION:")[1].split("\n")[0].strip()
-            response_msg = response_text.split("RESPONSE:")[1].split("PARAMS:")[0].strip()
-            
-            params = {}
-            if "PARAMS:" in response_text:
-                param_str = response_text.split("PARAMS:")[1].strip()
-                for pair in param_str.split(","):
-                    if "=" in pair:
-                        key, val = pair.split("=", 1)
-                        params[key.strip()] = val.strip()
-            
-            if action_type == "MAP":
-                column = params.get("column", "")
-                if column and column in columns:
-                    return response_msg, [column]
-                else:
-                    return f"Column '{column}' not found. Available columns: {', '.join(columns)}", None
-            else:
-                return response_msg, None
-        else:
-            return response_text, None
-            
-    except Exception as e:
-        return f"AI Error: {str(e)}", None
-
-# import google.generativeai as genai
-# from flask import current_app 
-# AI_COMMAND = """
-# You are a GIS visualization assistant. Follow these rules:
-
-# 1. When asked for column names, return only the list
-# 2. For visualization requests, find best column match
-# 3. For data explanation: brief, friendly with emojis
-# 4. Be concise - column names when possible
-# 5. Handle conversation naturally
-# """
-
-# def process_user_query(message, columns, api_key):
-#     try:
-#         genai.configure(api_key=api_key)
-#         model = genai.GenerativeModel("gemini-1.5-flash")
-        
-#         base_prompt = AI_COMMAND
-#         if columns:  # Only include columns if we have a file
-#             base_prompt += f"\nCOLUMNS: {columns}"
-            
-#         prompt = f"{base_prompt}\nQUERY: {message}"
-#         response = model.generate_content(prompt)
-        
-#         return parse_response(response.text, columns)
-#     except Exception as e:
-#         return f"AI Error: {str(e)}", None
-
-# def parse_response(text, columns):
-#     text = text.strip()
-    
-#     # Check for column existence only if we have columns
-#     if columns and "doesn't exist" in text:
-#         return text, None
-        
-#     # Extract column name from response
-#     if columns:
-#         for column in columns:
-#             if column.lower() in text.lower():
-#                 return text, column  # Return the matched column name
-    
-#     # For general conversation, return text with no column
+import re
+from collections import Counter
+from flask import current_app, has_app_context
+from app.utils.llm_client import generate_text
+from app.utils.intent_parser import rank_columns
+from app.utils.column_profile import column_summary
+
+# Messages asking about the schema itself need every column name
+_SCHEMA_QUESTION = re.compile(r"\b(columns?|fields?|attributes?|variables?)\b", re.IGNORECASE)
+_VALUE_WORD = re.compile(r"[^\W\d_]{3}")
+
+def _config(name, default):
+    """Read an app setting, falling back to ``default`` outside an application context"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def schema_digest(columns, max_groups=15):
+    """One-line summary of a wide schema: column count and the most common name prefixes"""
+    prefixes = Counter(re.split(r"[_\W\d]", column, maxsplit=1)[0] or column for column in columns)
+    groups = ', '.join(f"{prefix}* ({count})" for prefix, count in prefixes.most_common(max_groups))
+    more = ', ...' if len(prefixes) > max_groups else ''
+    return f"{len(columns)} columns in total; name prefixes: {groups}{more}"
+
+def _listed(columns, profile):
+    """Column names for the prompt, each with its type and range or sample values when profiled"""
+    if profile is None:
+        return str(columns)
+    return '; '.join(
+        f"{column} ({column_summary(profile['columns'][column])})" if column in profile['columns'] else column
+        for column in columns
+    )
+
+def describe_columns(message, columns, profile=None):
+    """
+    Column list for the prompt.
+
+    Up to PROMPT_MAX_COLUMNS names are sent as they are. Wider schemas are reduced to
+    the PROMPT_TOP_COLUMNS names most relevant to the message plus a schema digest,
+    unless the message is about the schema itself (it mentions columns or fields) or
+    no column looks relevant, in which case the full list of names is sent. With the
+    dataset ``profile``, the columns sent carry a short summary of their values.
+
+    Returns:
+        tuple: (text for the prompt, number of column names it lists)
+    """
+    if len(columns) <= _config('PROMPT_MAX_COLUMNS', 40):
+        return _listed(columns, profile), len(columns)
+    values = None
+    if profile is not None:
+        # Only values with a word in them; codes and numbers would match by accident
+        values = {column: [value for value, _ in entry['top'] if _VALUE_WORD.search(value)]
+                  for column, entry in profile['columns'].items() if entry.get('top')}
+    candidates = rank_columns(message, columns, _config('PROMPT_TOP_COLUMNS', 20), values)
+    if not candidates or _SCHEMA_QUESTION.search(message):
+        return str(columns), len(columns)
+    return (
+        f"{_listed(candidates, profile)} (the columns most relevant to the query; {schema_digest(columns)})",
+        len(candidates)
+    )
+
+def _build_prompt(message, columns_text):
+    return f"""
+        You are a GIS visualization assistant. Analyze this user query and determine:
+        1. Is it a general question about GIS concepts?
+        2. Is it a request for a specific action (map, stats, etc)?
+        3. What parameters are needed for the action?
+        4. For data explanation: brief, friendly with emojis
+        
+        Available columns: {columns_text}
+        
+        Examples:
+        - "What is NDVI?" → GENERAL
+        - "Show me a map of population" → ACTION:MAP (column=population)
+        - "Calculate statistics for income" → ACTION:STATS (column=income)
+        - "Add a scale bar to the map" → ACTION:MAP_ELEMENT (element=scale_bar)
+        
+        Respond in this format:
+        TYPE: [GENERAL|ACTION:type]
+        RESPONSE: [your response]
+        PARAMS: [key=value, ...] (if applicable)
+        
+        User query: {message}
+        """
+
+def _mapped_column(response_text):
+    """Column named in an ACTION:MAP answer, or None"""
+    if "TYPE: ACTION:MAP" not in response_text or "PARAMS:" not in response_text:
+        return None
+    for pair in response_text.split("PARAMS:")[1].split(","):
+        if "=" in pair:
+            key, val = pair.split("=", 1)
+            if key.strip() == "column":
+                return val.strip()
+    return None
+
+def process_user_query(message, columns, api_key, profile=None):
+    try:
+        columns_text, columns_sent = describe_columns(message, columns, profile)
+        response_text = generate_text(
+            _build_prompt(message, columns_text), api_key,
+            details={'columns_sent': columns_sent, 'columns_total': len(columns)}
+        )
+        if columns_sent < len(columns):
+            column = _mapped_column(response_text)
+            if column is not None and column not in columns:
+                # The shortlist missed the column the user meant: ask again with the full schema
+                response_text = generate_text(
+                    _build_prompt(message, str(columns)), api_key,
+                    details={'columns_sent': len(columns), 'columns_total': len(columns), 'fallback': True}
+                )
+        
+        if "TYPE: GENERAL" in response_text:
+            return response_text.split("RESPONSE:")[1].strip(), None
+        elif "TYPE: ACTION:" in response_text:
+            action_type = response_text.split("TYPE: ACTION:")[1].split("\n")[0].strip()
+            response_msg = response_text.split("RESPONSE:")[1].split("PARAMS:")[0].strip()
+            
+            params = {}
+            if "PARAMS:" in response_text:
+                param_str = response_text.split("PARAMS:")[1].strip()
+                for pair in param_str.split(","):
+                    if "=" in pair:
+                        key, val = pair.split("=", 1)
+                        params[key.strip()] = val.strip()
+            
+            if action_type == "MAP":
+                column = params.get("column", "")
+                if column and column in columns:
+                    return response_msg, [column]
+                else:
+                    return f"Column '{column}' not found. Available columns: {', '.join(columns)}", None
+            else:
+                return response_msg, None
+        else:
+            return response_text, None
+            
+    except Exception as e:
+        return f"AI Error: {str(e)}", None
+
+# import google.generativeai as genai
+# from flask import current_app 
+# AI_COMMAND = """
+# You are a GIS visualization assistant. Follow these rules:
+
+# 1. When asked for column names, return only the list
+# 2. For visualization requests, find best column match
+# 3. For data explanation: brief, friendly with emojis
+# 4. Be concise - column names when possible
+# 5. Handle conversation naturally
+# """
+
+# def process_user_query(message, columns, api_key):
+#     try:
+#         genai.configure(api_key=api_key)
+#         model = genai.GenerativeModel("gemini-1.5-flash")
+        
+#         base_prompt = AI_COMMAND
+#         if columns:  # Only include columns if we have a file
+#             base_prompt += f"\nCOLUMNS: {columns}"
+            
+#         prompt = f"{base_prompt}\nQUERY: {message}"
+#         response = model.generate_content(prompt)
+        
+#         return parse_response(response.text, columns)
+#     except Exception as e:
+#         return f"AI Error: {str(e)}", None
+
+# def parse_response(text, columns):
+#     text = text.strip()
+    
+#     # Check for column existence only if we have columns
+#     if columns and "doesn't exist" in text:
+#         return text, None
+        
+#     # Extract column name from response
+#     if columns:
+#         for column in columns:
+#             if column.lower() in text.lower():
+#                 return text, column  # Return the matched column name
+    
+#     # For general conversation, return text with no column
 #     return text, None
\ No newline at end of file
@@ -0,0 +1,197 @@
+import ast
+import re
+import hashlib
+import threading
+import numpy as np
+
+# Built-in indices: band roles (filled from the requested bands, in order) and formula.
+# EVI and SAVI constants assume surface reflectance scaled to 0-1.
+INDEX_DEFINITIONS = {
+    'NDVI': (('nir', 'red'), '(nir - red) / (nir + red)'),
+    'NDWI': (('green', 'nir'), '(green - nir) / (green + nir)'),
+    'SAWI': (('nir', 'swir'), '(nir - swir) / (nir + swir)'),
+    'EVI': (('nir', 'red', 'blue'), '2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1)'),
+    'SAVI': (('nir', 'red'), '1.5 * (nir - red) / (nir + red + 0.5)'),
+    'NBR': (('nir', 'swir2'), '(nir - swir2) / (nir + swir2)'),
+}
+
+_BINARY_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+_FUNCTIONS = {
+    'abs': np.abs,
+    'sqrt': np.sqrt,
+    'log': np.log,
+    'exp': np.exp,
+}
+_BAND_NAME = re.compile(r'^b(\d+)$')
+_MAX_EXPRESSION_LENGTH = 500
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+class BandExpression:
+    """
+    A band-math formula compiled to a short program of in-place float32 ufunc calls.
+
+    The program is evaluated once per block: every intermediate lives in one of a few
+    scratch buffers that are overwritten as soon as their value has been consumed, and
+    the last operation writes straight into the caller's output array.
+
+    Args:
+        expression (str): Formula using ``+ - * / **``, numbers, ``abs``/``sqrt``/``log``/``exp``
+            and band variables.
+        variables (dict): Maps variable names to 1-based band numbers. When omitted,
+            variables must be named ``b<N>`` and refer to band N directly.
+    """
+
+    def __init__(self, expression, variables=None):
+        if len(expression) > _MAX_EXPRESSION_LENGTH:
+            raise ValueError('Index expression is too long')
+        try:
+            tree = ast.parse(expression, mode='eval').body
+        except SyntaxError:
+            raise ValueError(f"Invalid index expression: {expression}")
+        self.expression = expression
+        self._variables = variables
+        self._program = []
+        self._free = []
+        self.n_scratch = 0
+        result = self._compile(tree)
+        self._finish(result)
+        self.bands = sorted({
+            operand[1] for instruction in self._program for operand in instruction[2:]
+            if operand[0] == 'band'
+        })
+
+    def _band(self, name):
+        if self._variables is not None:
+            if name not in self._variables:
+                raise ValueError(f"Unknown band variable: {name}")
+            return int(self._variables[name])
+        match = _BAND_NAME.match(name)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Unknown band variable: {name} (use b1, b2, ...)")
+        return int(match.group(1))
+
+    def _scratch(self):
+        if self._free:
+            return self._free.pop()
+        self.n_scratch += 1
+        return ('scratch', self.n_scratch - 1)
+
+    def _release(self, operand):
+        if operand[0] == 'scratch':
+            self._free.append(operand)
+
+    def _emit(self, ufunc, *operands):
+        """Append ``ufunc(*operands)``, writing into a consumed scratch buffer when possible"""
+        target = next((op for op in operands if op[0] == 'scratch'), None)
+        for op in operands:
+            if op is not target:
+                self._release(op)
+        if target is None:
+            target = self._scratch()
+        self._program.append((ufunc, target) + operands)
+        return target
+
+    def _compile(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return ('const', float(node.value))
+        if isinstance(node, ast.Name):
+            return ('band', self._band(node.id))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            if operand[0] == 'const':
+                return ('const', -operand[1])
+            return self._emit(np.negative, operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            ufunc = _BINARY_OPS[type(node.op)]
+            left = self._compile(node.left)
+            right = self._compile(node.right)
+            if left[0] == 'const' and right[0] == 'const':
+                # Fold constant sub-expressions at compile time
+                with np.errstate(all='ignore'):
+                    return ('const', float(ufunc(np.float32(left[1]), np.float32(right[1]))))
+            return self._emit(ufunc, left, right)
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in _FUNCTIONS and len(node.args) == 1 and not node.keywords):
+            operand = self._compile(node.args[0])
+            if operand[0] == 'const':
+                with np.errstate(all='ignore'):
+                    return ('const', float(_FUNCTIONS[node.func.id](np.float32(operand[1]))))
+            return self._emit(_FUNCTIONS[node.func.id], operand)
+        raise ValueError(f"Unsupported element in index expression: {type(node).__name__}")
+
+    def _finish(self, result):
+        """Retarget the last instruction at the output array"""
+        if self._program and self._program[-1][1] == result:
+            ufunc, _, *operands = self._program.pop()
+            self._program.append((ufunc, ('out', None)) + tuple(operands))
+        else:
+            # Bare band or constant: copy it into the output
+            self._program.append((np.positive, ('out', None), result))
+
+    def evaluate(self, band_data, out):
+        """
+        Run the program over one block.
+
+        Args:
+            band_data (dict): float32 arrays of the block keyed by band number (see ``bands``).
+            out (np.ndarray): float32 array (or view) receiving the result.
+        """
+        scratch = [np.empty(out.shape, dtype=np.float32) for _ in range(self.n_scratch)]
+
+        def resolve(operand):
+            kind, value = operand
+            if kind == 'band':
+                return band_data[value]
+            if kind == 'scratch':
+                return scratch[value]
+            if kind == 'out':
+                return out
+            return np.float32(value)
+
+        # Division by zero and similar yield inf/NaN, which callers treat as no data
+        with np.errstate(all='ignore'):
+            for ufunc, target, *operands in self._program:
+                ufunc(*(resolve(op) for op in operands), out=resolve(target))
+        return out
+
+def compile_index(index_type, bands):
+    """
+    Compile a built-in index name or a custom ``b<N>`` expression, cached per definition.
+
+    For built-ins, ``bands`` supplies the band number of each role in order (e.g. NIR
+    then red for NDVI); custom expressions name their bands directly and ignore it.
+    """
+    key = (index_type, tuple(int(band) for band in bands))
+    compiled = _compiled.get(key)
+    if compiled is not None:
+        return compiled
+
+    if index_type in INDEX_DEFINITIONS:
+        roles, expression = INDEX_DEFINITIONS[index_type]
+        if len(bands) != len(roles):
+            raise ValueError(f"{index_type} needs {len(roles)} bands: {', '.join(roles)}")
+        compiled = BandExpression(expression, dict(zip(roles, key[1])))
+    else:
+        compiled = BandExpression(index_type)
+
+    with _compiled_lock:
+        if len(_compiled) > 1024:
+            _compiled.clear()
+        _compiled[key] = compiled
+    return compiled
+
+def index_label(index_type):
+    """File-name-safe label: the built-in name, or a short hash of a custom expression"""
+    if index_type in INDEX_DEFINITIONS:
+        return index_type
+    return f"custom_{hashlib.sha1(index_type.encode('utf-8')).hexdigest()[:8]}"
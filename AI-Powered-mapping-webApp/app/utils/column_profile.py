@@ -0,0 +1,162 @@
+import os
+import json
+import hashlib
+import math
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from flask import current_app, has_app_context
+from app.utils.lru_cache import LRUCache
+
+# Quantiles stored per numeric column, on top of the quartiles of pandas' describe()
+PROFILE_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def _config(name, default):
+    """Read an app setting, falling back to ``default`` outside an application context"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                # Sized in entries: every profile counts as 1
+                _cache = LRUCache(64, sizeof=lambda value: 1)
+    return _cache
+
+def _plain(value):
+    """JSON-safe Python scalar: NaN/inf become None, numpy types become bool/int/float"""
+    if isinstance(value, (np.bool_, bool)):
+        return bool(value)
+    if isinstance(value, (np.integer, int)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+def profile_path(dataset_path):
+    """Path of the profile kept next to a vector dataset"""
+    return os.path.splitext(dataset_path)[0] + '.profile.json'
+
+def profile_column(series, bins=10, top=10):
+    """
+    Summary of one attribute column.
+
+    Every column gets dtype, count, null count and number of distinct values. Numeric
+    columns add pandas' describe() statistics, extra quantiles and a ``bins``-bin
+    histogram; other columns add their ``top`` most frequent values. Boolean columns
+    get both describe() (count, unique, top, freq) and their values.
+    """
+    nulls = int(series.isna().sum())
+    try:
+        nunique = int(series.nunique())
+    except TypeError:
+        # Unhashable values (lists, dicts) are compared by their text
+        series = series.astype(str)
+        nunique = int(series.nunique())
+    profile = {'dtype': str(series.dtype), 'count': len(series) - nulls, 'nulls': nulls, 'nunique': nunique}
+
+    if pd.api.types.is_bool_dtype(series):
+        # Numeric to pandas, so statistics requests describe them as they always did
+        profile['describe'] = {key: _plain(value) for key, value in series.describe().items()}
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        profile['numeric'] = True
+        profile['describe'] = {key: _plain(value) for key, value in series.describe().items()}
+        values = series.dropna().to_numpy(dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values):
+            profile['quantiles'] = {
+                f"{q * 100:g}%": float(value)
+                for q, value in zip(PROFILE_QUANTILES, np.quantile(values, PROFILE_QUANTILES))
+            }
+            counts, edges = np.histogram(values, bins=bins)
+            profile['histogram'] = {'edges': edges.tolist(), 'counts': counts.tolist()}
+    else:
+        if pd.api.types.is_datetime64_any_dtype(series) and profile['count']:
+            profile['min'] = _plain(series.min())
+            profile['max'] = _plain(series.max())
+        profile['top'] = [[str(value), int(count)] for value, count in series.value_counts().head(top).items()]
+    return profile
+
+def profile_dataset(gdf):
+    """Profiles of every attribute column of a layer, plus its size, geometry types and extent"""
+    bins = _config('PROFILE_HISTOGRAM_BINS', 10)
+    top = _config('PROFILE_TOP_CATEGORIES', 10)
+    geometry = gdf.geometry.name
+    return {
+        'rows': len(gdf),
+        'geometry_types': sorted(gdf.geom_type.dropna().unique().tolist()),
+        'crs': gdf.crs.to_string() if gdf.crs is not None else None,
+        'bounds': [_plain(value) for value in gdf.total_bounds] if len(gdf) else None,
+        'columns': {
+            column: profile_column(gdf[column], bins=bins, top=top)
+            for column in gdf.columns if column != geometry
+        }
+    }
+
+def write_profile(dataset_path, gdf):
+    """Profile ``gdf`` and store the result next to ``dataset_path``; returns the profile"""
+    profile = profile_dataset(gdf)
+    directory = os.path.dirname(os.path.abspath(dataset_path))
+    # Write to a temporary file first so concurrent readers never see a partial profile
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(profile, f)
+    os.replace(tmp_path, profile_path(dataset_path))
+    return profile
+
+def load_profile(dataset_path):
+    """
+    The stored profile of a dataset, or None when there is none or the dataset was
+    rewritten after it. ``profile['fingerprint']`` is a hash of the stored profile.
+    Profiles are cached in memory and must be treated as read-only.
+    """
+    path = profile_path(dataset_path)
+    try:
+        mtime = os.path.getmtime(path)
+        if mtime < os.path.getmtime(dataset_path):
+            return None
+    except OSError:
+        return None
+    key = (path, mtime)
+    cache = _get_cache()
+    profile = cache.get(key)
+    if profile is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+        profile = json.loads(data)
+        profile['fingerprint'] = hashlib.sha1(data).hexdigest()
+        cache.put(key, profile)
+    return profile
+
+def is_numeric(column_profile):
+    """True for number columns (not booleans), which have a range and a histogram"""
+    return column_profile.get('numeric', False)
+
+def describe_column(column_profile):
+    """The describe() statistics of a numeric or boolean column profile, or None for other columns"""
+    if 'describe' not in column_profile:
+        return None
+    return dict(column_profile['describe'])
+
+def column_summary(column_profile, examples=3):
+    """A few words on a column for model prompts, e.g. "int64, 0 to 1200, 3 nulls" """
+    parts = [column_profile['dtype']]
+    if is_numeric(column_profile):
+        stats = column_profile['describe']
+        if stats.get('min') is not None:
+            parts.append(f"{stats['min']:.6g} to {stats['max']:.6g}")
+    elif column_profile.get('top'):
+        values = ', '.join(value for value, _ in column_profile['top'][:examples])
+        parts.append(f"{column_profile['nunique']} distinct, e.g. {values}")
+    if column_profile['nulls']:
+        parts.append(f"{column_profile['nulls']} nulls")
+    return ', '.join(parts)
@@ -0,0 +1,97 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import shapely
+from flask import current_app
+from app.utils.lru_cache import LRUCache
+from app.utils.file_processor import read_dataset, resolve_dataset_path, dataset_id
+
+_cache = None
+_cache_lock = threading.Lock()
+_content_hashes = LRUCache(4096, sizeof=lambda digest: 1)
+
+def estimate_gdf_bytes(gdf):
+    """Approximate in-memory footprint of a GeoDataFrame in bytes"""
+    attributes = gdf.drop(columns=gdf.geometry.name)
+    attr_bytes = int(attributes.memory_usage(deep=True).sum())
+    geoms = np.asarray(gdf.geometry.values)
+    # 16 bytes per xy coordinate plus a rough per-object overhead for GEOS geometries
+    geom_bytes = int(shapely.get_num_coordinates(geoms).sum()) * 16 + len(geoms) * 100
+    return attr_bytes + geom_bytes
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LRUCache(
+                    current_app.config['DATASET_CACHE_MAX_BYTES'],
+                    sizeof=estimate_gdf_bytes
+                )
+    return _cache
+
+def file_key(path):
+    """Cache key for exactly the file at ``path``; changes whenever it is rewritten"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def dataset_key(path):
+    """Cache key for a dataset file; changes whenever the file or its columnar copy is rewritten"""
+    return file_key(resolve_dataset_path(path))
+
+def content_hash(path):
+    """SHA-1 of a dataset file (its columnar copy when there is one), computed once per file version"""
+    return file_hash(resolve_dataset_path(path))
+
+def file_hash(path):
+    """SHA-1 of exactly the file at ``path``, computed once per file version"""
+    key = file_key(path)
+    digest = _content_hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha1()
+        with open(key[0], 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _content_hashes.put(key, digest)
+    return digest
+
+def load_dataset(path, columns=None, where=None, bbox=None):
+    """
+    Return the features stored at ``path``, reading the file only on a cache miss.
+
+    Projection and filters are pushed down to the reader (see ``read_dataset``) and
+    are part of the cache key, so differently filtered views are cached separately.
+    The cached frame is shared by every request in the process, so callers always
+    receive a copy they are free to modify (map generation fills NaNs in place).
+    ``gdf.attrs['fingerprint']`` is a content hash of the returned view.
+    """
+    key = dataset_key(path) + (
+        tuple(columns) if columns is not None else None,
+        tuple(where or ()),
+        tuple(bbox) if bbox is not None else None
+    )
+    cache = _get_cache()
+    gdf = cache.get(key)
+    if gdf is None:
+        gdf = read_dataset(path, columns=columns, where=where, bbox=bbox)
+        # Identifies this exact view of the data for downstream caches (e.g. rendered maps)
+        gdf.attrs['fingerprint'] = hashlib.sha1(
+            repr((content_hash(path),) + key[3:]).encode('utf-8')
+        ).hexdigest()
+        # Same rows regardless of column projection, so simplified geometry can be shared
+        gdf.attrs['geometry_fingerprint'] = hashlib.sha1(
+            repr((content_hash(path),) + key[4:]).encode('utf-8')
+        ).hexdigest()
+        if not where and bbox is None:
+            # Unfiltered views can be served as vector tiles of the whole dataset
+            gdf.attrs['dataset_id'] = dataset_id(path)
+        cache.put(key, gdf)
+    return gdf.copy()
+
+def cache_stats():
+    return _get_cache().stats()
+
+def clear_cache():
+    _get_cache().clear()
@@ -1,155 +1,363 @@
-import os
-import zipfile
-import tempfile
-import geopandas as gpd
-import rasterio
-from werkzeug.utils import secure_filename
-from flask import current_app
-
-def get_file_type(filename):
-    """Determine file type based on extension"""
-    ext = filename.split('.')[-1].lower()
-    
-    if ext in ['geojson', 'json']:
-        return 'geojson'
-    elif ext in ['shp', 'shx', 'dbf', 'prj']:
-        return 'shapefile'
-    elif ext in ['tif', 'tiff']:
-        return 'raster'
-    elif ext == 'zip':
-        return 'shapefile'  # Assuming zip contains shapefile
-    else:
-        raise ValueError(f"Unsupported file extension: {ext}")
-
-def process_uploaded_file(file):
-    try:
-        filename = secure_filename(file.filename)
-        file_type = get_file_type(filename)
-        upload_dir = current_app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        if file_type == 'shapefile':
-            # Handle shapefile (zipped or individual files)
-            temp_dir = tempfile.mkdtemp()
-            filepath = os.path.join(temp_dir, filename)
-            file.save(filepath)
-            
-            # If it's a zip file, extract it
-            if filename.endswith('.zip'):
-                with zipfile.ZipFile(filepath, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
-                # Find the .shp file
-                shp_file = None
-                for f in os.listdir(temp_dir):
-                    if f.endswith('.shp'):
-                        shp_file = os.path.join(temp_dir, f)
-                        break
-                if not shp_file:
-                    raise ValueError("No .shp file found in the uploaded zip")
-                gdf = gpd.read_file(shp_file)
-            else:
-                # Handle individual shapefile component
-                gdf = gpd.read_file(filepath)
-            
-            # Save as GeoJSON for consistency
-            output_path = os.path.join(upload_dir, os.path.splitext(filename)[0] + '.geojson')
-            gdf.to_file(output_path, driver='GeoJSON')
-            return {
-                'message': 'Shapefile uploaded and converted to GeoJSON',
-                'filepath': output_path,
-                'columns': list(gdf.columns),
-                'file_type': 'vector'
-            }
-            
-        elif file_type == 'raster':
-            # Handle raster files
-            filepath = os.path.join(upload_dir, filename)
-            file.save(filepath)
-            
-            with rasterio.open(filepath) as src:
-                return {
-                    'message': 'Raster file uploaded successfully',
-                    'filepath': filepath,
-                    'file_type': 'raster',
-                    'band_count': src.count
-                }
-                
-        else:  # GeoJSON
-            filepath = os.path.join(upload_dir, filename)
-            file.save(filepath)
-            gdf = gpd.read_file(filepath)
-            return {
-                'message': 'GeoJSON file uploaded successfully',
-                'filepath': filepath,
-                'columns': list(gdf.columns),
-                'file_type': 'vector'
-            }
-            
-    except Exception as e:
-        raise ValueError(f"Error processing file: {str(e)}")
-
-# ALLOWED_EXTENSIONS = {
-#     'geojson': ['.geojson', '.json'],
-#     'shapefile': ['.shp', '.shx', '.dbf', '.prj'],
-#     'raster': ['.tif', '.tiff']
-# }
-
-# def allowed_file(filename, file_type):
-#     ext = os.path.splitext(filename)[1].lower()
-#     return ext in ALLOWED_EXTENSIONS.get(file_type, [])
-
-# def process_uploaded_file(file, file_type):
-#     try:
-#         filename = secure_filename(file.filename)
-#         upload_dir = current_app.config['UPLOAD_FOLDER']
-#         os.makedirs(upload_dir, exist_ok=True)
-        
-#         if file_type == 'shapefile':
-#             temp_dir = tempfile.mkdtemp()
-#             zip_path = os.path.join(temp_dir, filename)
-#             file.save(zip_path)
-            
-#             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-#                 zip_ref.extractall(temp_dir)
-            
-#             shp_file = None
-#             for f in os.listdir(temp_dir):
-#                 if f.endswith('.shp'):
-#                     shp_file = os.path.join(temp_dir, f)
-#                     break
-            
-#             if not shp_file:
-#                 raise ValueError("No .shp file found in the uploaded zip")
-            
-#             gdf = gpd.read_file(shp_file)
-#             filepath = os.path.join(upload_dir, os.path.splitext(filename)[0] + '.geojson')
-#             gdf.to_file(filepath, driver='GeoJSON')
-            
-#         elif file_type == 'raster':
-#             filepath = os.path.join(upload_dir, filename)
-#             file.save(filepath)
-            
-#             with rasterio.open(filepath) as src:
-#                 pass  # Validate raster
-                
-#             return {
-#                 'message': 'Raster file uploaded successfully',
-#                 'filepath': filepath,
-#                 'file_type': 'raster',
-#                 'band_count': src.count
-#             }
-            
-#         else:  # GeoJSON
-#             filepath = os.path.join(upload_dir, filename)
-#             file.save(filepath)
-#             gdf = gpd.read_file(filepath)
-            
-#         return {
-#             'message': 'File uploaded successfully',
-#             'filepath': filepath,
-#             'columns': list(gdf.columns),
-#             'file_type': 'vector'
-#         }
-        
-#     except Exception as e:
+import os
+import json
+import operator
+import zipfile
+import tempfile
+import geopandas as gpd
+import pandas as pd
+import rasterio
+from rasterio.shutil import copy as rio_copy
+from werkzeug.utils import secure_filename
+from flask import current_app
+from app.utils.column_profile import write_profile
+from app.utils.query_parser import FilterError
+
+def get_file_type(filename):
+    """Determine file type based on extension"""
+    ext = filename.split('.')[-1].lower()
+    
+    if ext in ['geojson', 'json']:
+        return 'geojson'
+    elif ext in ['shp', 'shx', 'dbf', 'prj']:
+        return 'shapefile'
+    elif ext in ['tif', 'tiff']:
+        return 'raster'
+    elif ext == 'zip':
+        return 'shapefile'  # Assuming zip contains shapefile
+    else:
+        raise ValueError(f"Unsupported file extension: {ext}")
+
+# Vector formats that get a columnar copy; rasters and other files always resolve to themselves
+VECTOR_EXTENSIONS = ('.shp', '.geojson', '.json', '.gpkg', '.zip')
+
+# Per-feature bounds stored in the columnar copy so bbox filters can be pushed down to Arrow
+BBOX_COLUMNS = ('__bbox_minx', '__bbox_miny', '__bbox_maxx', '__bbox_maxy')
+
+_COMPARISONS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+def columnar_path(filepath):
+    """Path of the GeoParquet copy kept next to a vector upload"""
+    return os.path.splitext(filepath)[0] + '.parquet'
+
+def write_columnar_copy(gdf, filepath):
+    """
+    Write ``gdf`` as GeoParquet next to ``filepath`` so later reads skip GeoJSON parsing.
+
+    Returns the parquet path, or None when pyarrow is not installed.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        current_app.logger.warning("pyarrow not installed; keeping uploads as GeoJSON only")
+        return None
+    bounds = gdf.geometry.bounds
+    gdf = gdf.assign(**{
+        name: bounds[side] for name, side in zip(BBOX_COLUMNS, ['minx', 'miny', 'maxx', 'maxy'])
+    })
+    output_path = columnar_path(filepath)
+    # Small row groups keep min/max statistics selective for filter pushdown
+    gdf.to_parquet(output_path, index=False, row_group_size=10000)
+    return output_path
+
+def store_vector_dataset(gdf, filepath):
+    """
+    Save a vector layer as GeoParquet next to ``filepath``, or as GeoJSON without pyarrow.
+
+    Returns the path the layer was written to.
+    """
+    output_path = write_columnar_copy(gdf, filepath)
+    if output_path is None:
+        output_path = os.path.splitext(filepath)[0] + '.geojson'
+        gdf.to_file(output_path, driver='GeoJSON')
+    return output_path
+
+def dataset_id(filepath):
+    """Short id of an uploaded dataset (its file stem), used in tile URLs"""
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+def resolve_dataset_path(filepath):
+    """Prefer an up-to-date columnar copy of a vector dataset over the original file"""
+    if not filepath.lower().endswith(VECTOR_EXTENSIONS):
+        return filepath
+    parquet_path = columnar_path(filepath)
+    if (os.path.exists(parquet_path) and
+            os.path.getmtime(parquet_path) >= os.path.getmtime(filepath)):
+        return parquet_path
+    return filepath
+
+def _coerce_filter_value(column, value, numeric):
+    """
+    Match a parsed filter literal to the column type so readers can compare it.
+
+    Raises FilterError for a numeric column compared with something that is not a number.
+    """
+    if numeric and isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            raise FilterError(f"Cannot compare the numeric column '{column}' with '{value}'; use a number")
+    if not numeric and not isinstance(value, str):
+        return str(value)
+    return value
+
+def _where_sql(where, numeric_columns):
+    """Render (column, operator, value) conditions as an OGR SQL WHERE clause"""
+    clauses = []
+    for column, op, value in where:
+        value = _coerce_filter_value(column, value, column in numeric_columns)
+        literal = repr(value) if not isinstance(value, str) else "'" + value.replace("'", "''") + "'"
+        clauses.append(f'"{column}" {op} {literal}')
+    return ' AND '.join(clauses)
+
+def _filter_in_memory(gdf, columns, where, bbox):
+    """Apply projection and filters after a full read when the reader cannot push them down"""
+    for column, op, value in where or []:
+        numeric = pd.api.types.is_numeric_dtype(gdf[column])
+        gdf = gdf[_COMPARISONS[op](gdf[column], _coerce_filter_value(column, value, numeric))]
+    if bbox is not None:
+        minx, miny, maxx, maxy = bbox
+        gdf = gdf.cx[minx:maxx, miny:maxy]
+    if columns is not None:
+        gdf = gdf[[c for c in columns if c != gdf.geometry.name] + [gdf.geometry.name]]
+    return gdf
+
+def _read_parquet(path, columns, where, bbox):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(path)
+    geometry_column = json.loads(schema.metadata[b'geo'])['primary_column']
+    if columns is not None:
+        columns = [c for c in columns if c != geometry_column] + [geometry_column]
+
+    filters = []
+    for column, op, value in where or []:
+        numeric = pa.types.is_integer(schema.field(column).type) or pa.types.is_floating(schema.field(column).type)
+        filters.append((column, op, _coerce_filter_value(column, value, numeric)))
+    if bbox is not None and BBOX_COLUMNS[0] in schema.names:
+        minx, miny, maxx, maxy = bbox
+        filters += [
+            (BBOX_COLUMNS[2], '>=', minx),
+            (BBOX_COLUMNS[0], '<=', maxx),
+            (BBOX_COLUMNS[3], '>=', miny),
+            (BBOX_COLUMNS[1], '<=', maxy),
+        ]
+        bbox = None
+
+    gdf = gpd.read_parquet(path, columns=columns, filters=filters or None)
+    # Copies written before bbox columns existed are filtered after the read
+    return _filter_in_memory(gdf, None, None, bbox)
+
+def _read_ogr(path, columns, where, bbox):
+    try:
+        import pyogrio
+    except ImportError:
+        return _filter_in_memory(gpd.read_file(path), columns, where, bbox)
+
+    info = pyogrio.read_info(path)
+    fields = list(info['fields'])
+    kwargs = {}
+    if columns is not None:
+        # OGR needs the filtered fields loaded to evaluate the WHERE clause
+        filter_columns = [col for col, _, _ in where or [] if col not in columns]
+        kwargs['columns'] = [col for col in list(columns) + filter_columns if col in fields]
+    if where:
+        numeric_columns = {
+            name for name, dtype in zip(fields, info['dtypes'])
+            if dtype.startswith(('int', 'float'))
+        }
+        kwargs['where'] = _where_sql(where, numeric_columns)
+    gdf = gpd.read_file(path, engine='pyogrio', bbox=bbox, **kwargs)
+    if columns is not None:
+        gdf = gdf.drop(columns=filter_columns)
+    return gdf
+
+def read_dataset(filepath, columns=None, where=None, bbox=None):
+    """
+    Read a vector dataset from its columnar copy when available, loading only what is needed.
+
+    Args:
+        filepath (str): Path of the uploaded dataset.
+        columns (list): Attribute columns to load besides geometry; None loads every column.
+        where (list): (column, operator, value) conditions that must all hold.
+        bbox (tuple): (minx, miny, maxx, maxy) extent that features must intersect.
+
+    Returns:
+        gpd.GeoDataFrame: The matching features.
+    """
+    path = resolve_dataset_path(filepath)
+    if path.lower().endswith('.parquet'):
+        gdf = _read_parquet(path, columns, where, bbox)
+    else:
+        gdf = _read_ogr(path, columns, where, bbox)
+    return gdf.drop(columns=[c for c in BBOX_COLUMNS if c in gdf.columns])
+
+def convert_to_cog(filepath, blocksize=512):
+    """
+    Rewrite a raster in place as a Cloud-Optimized GeoTIFF.
+
+    The COG driver tiles the data internally and builds averaged overviews until
+    the smallest level fits in one block, so reduced-resolution reads never touch
+    full-resolution pixels.
+    """
+    tmp_path = filepath + '.cog.tmp'
+    try:
+        rio_copy(
+            filepath, tmp_path,
+            driver='COG',
+            compress='DEFLATE',
+            blocksize=blocksize,
+            overview_resampling='average',
+            bigtiff='IF_SAFER',
+            num_threads='ALL_CPUS'
+        )
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def process_uploaded_file(file):
+    try:
+        filename = secure_filename(file.filename)
+        file_type = get_file_type(filename)
+        upload_dir = current_app.config['UPLOAD_FOLDER']
+        os.makedirs(upload_dir, exist_ok=True)
+        
+        if file_type == 'shapefile':
+            # Handle shapefile (zipped or individual files)
+            temp_dir = tempfile.mkdtemp()
+            filepath = os.path.join(temp_dir, filename)
+            file.save(filepath)
+            
+            # If it's a zip file, extract it
+            if filename.endswith('.zip'):
+                with zipfile.ZipFile(filepath, 'r') as zip_ref:
+                    zip_ref.extractall(temp_dir)
+                # Find the .shp file
+                shp_file = None
+                for f in os.listdir(temp_dir):
+                    if f.endswith('.shp'):
+                        shp_file = os.path.join(temp_dir, f)
+                        break
+                if not shp_file:
+                    raise ValueError("No .shp file found in the uploaded zip")
+                gdf = gpd.read_file(shp_file)
+            else:
+                # Handle individual shapefile component
+                gdf = gpd.read_file(filepath)
+            
+            # Store as GeoParquet, falling back to GeoJSON for consistency
+            output_path = store_vector_dataset(gdf, os.path.join(upload_dir, filename))
+            # Column statistics computed once here serve later statistics requests and prompts
+            write_profile(output_path, gdf)
+            return {
+                'message': 'Shapefile uploaded successfully',
+                'filepath': output_path,
+                'columns': list(gdf.columns),
+                'file_type': 'vector'
+            }
+            
+        elif file_type == 'raster':
+            # Handle raster files
+            filepath = os.path.join(upload_dir, filename)
+            file.save(filepath)
+            # Tiled layout with overviews so previews and tiles read only what they show
+            convert_to_cog(filepath)
+            
+            with rasterio.open(filepath) as src:
+                return {
+                    'message': 'Raster file uploaded successfully',
+                    'filepath': filepath,
+                    'file_type': 'raster',
+                    'band_count': src.count,
+                    'overview_levels': src.overviews(1)
+                }
+                
+        else:  # GeoJSON
+            filepath = os.path.join(upload_dir, filename)
+            file.save(filepath)
+            gdf = gpd.read_file(filepath)
+            write_columnar_copy(gdf, filepath)
+            write_profile(filepath, gdf)
+            return {
+                'message': 'GeoJSON file uploaded successfully',
+                'filepath': filepath,
+                'columns': list(gdf.columns),
+                'file_type': 'vector'
+            }
+            
+    except Exception as e:
+        raise ValueError(f"Error processing file: {str(e)}")
+
+# ALLOWED_EXTENSIONS = {
+#     'geojson': ['.geojson', '.json'],
+#     'shapefile': ['.shp', '.shx', '.dbf', '.prj'],
+#     'raster': ['.tif', '.tiff']
+# }
+
+# def allowed_file(filename, file_type):
+#     ext = os.path.splitext(filename)[1].lower()
+#     return ext in ALLOWED_EXTENSIONS.get(file_type, [])
+
+# def process_uploaded_file(file, file_type):
+#     try:
+#         filename = secure_filename(file.filename)
+#         upload_dir = current_app.config['UPLOAD_FOLDER']
+#         os.makedirs(upload_dir, exist_ok=True)
+        
+#         if file_type == 'shapefile':
+#             temp_dir = tempfile.mkdtemp()
+#             zip_path = os.path.join(temp_dir, filename)
+#             file.save(zip_path)
+            
+#             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+#                 zip_ref.extractall(temp_dir)
+            
+#             shp_file = None
+#             for f in os.listdir(temp_dir):
+#                 if f.endswith('.shp'):
+#                     shp_file = os.path.join(temp_dir, f)
+#                     break
+            
+#             if not shp_file:
+#                 raise ValueError("No .shp file found in the uploaded zip")
+            
+#             gdf = gpd.read_file(shp_file)
+#             filepath = os.path.join(upload_dir, os.path.splitext(filename)[0] + '.geojson')
+#             gdf.to_file(filepath, driver='GeoJSON')
+            
+#         elif file_type == 'raster':
+#             filepath = os.path.join(upload_dir, filename)
+#             file.save(filepath)
+            
+#             with rasterio.open(filepath) as src:
+#                 pass  # Validate raster
+                
+#             return {
+#                 'message': 'Raster file uploaded successfully',
+#                 'filepath': filepath,
+#                 'file_type': 'raster',
+#                 'band_count': src.count
+#             }
+            
+#         else:  # GeoJSON
+#             filepath = os.path.join(upload_dir, filename)
+#             file.save(filepath)
+#             gdf = gpd.read_file(filepath)
+            
+#         return {
+#             'message': 'File uploaded successfully',
+#             'filepath': filepath,
+#             'columns': list(gdf.columns),
+#             'file_type': 'vector'
+#         }
+        
+#     except Exception as e:
 #         raise ValueError(f"Error processing {file_type}: {str(e)}")
\ No newline at end of file
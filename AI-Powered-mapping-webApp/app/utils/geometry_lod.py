@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import numpy as np
+import geopandas as gpd
+import shapely
+from flask import current_app, has_app_context
+from app.utils.lru_cache import LRUCache
+
+# Finest pyramid tolerance as a fraction of the dataset's largest extent; each level doubles it
+FINEST_TOLERANCE_FRACTION = 1 / 8192
+EARTH_CIRCUMFERENCE_M = 40075016.686
+
+_pyramids = None
+_pyramids_lock = threading.Lock()
+
+def _pyramid_bytes(pyramid):
+    return sum(
+        int(shapely.get_num_coordinates(geoms).sum()) * 16 + len(geoms) * 100
+        for _, geoms in pyramid
+    )
+
+def _get_pyramids():
+    global _pyramids
+    if _pyramids is None:
+        with _pyramids_lock:
+            if _pyramids is None:
+                max_bytes = current_app.config['LOD_CACHE_MAX_BYTES'] if has_app_context() else 256 * 1024 * 1024
+                _pyramids = LRUCache(max_bytes, sizeof=_pyramid_bytes)
+    return _pyramids
+
+def geometry_fingerprint(gdf):
+    """Hash identifying the geometries of a frame, independent of its attribute columns"""
+    fingerprint = gdf.attrs.get('geometry_fingerprint')
+    if fingerprint is None:
+        wkb = shapely.to_wkb(np.asarray(gdf.geometry.values))
+        fingerprint = hashlib.sha1(b''.join(wkb)).hexdigest()
+    return fingerprint
+
+def build_pyramid(geoms, span, levels):
+    """
+    Simplify geometries at ``levels`` successively doubling tolerances.
+
+    Each level is derived from the previous, finer one so only the first pass touches
+    every original vertex. ``preserve_topology`` keeps every geometry valid; borders
+    shared by neighbouring polygons can drift apart by at most the tolerance, which
+    stays below a pixel at the level chosen for output.
+
+    Returns:
+        list: (tolerance, geometry array) pairs, finest first.
+    """
+    pyramid = []
+    current = geoms
+    for tolerance in span * FINEST_TOLERANCE_FRACTION * 2.0 ** np.arange(levels):
+        current = shapely.simplify(current, tolerance, preserve_topology=True)
+        pyramid.append((float(tolerance), current))
+    return pyramid
+
+def pixel_size_at_zoom(zoom, crs):
+    """Ground size of one 256px web-map tile pixel at ``zoom``, in units of ``crs``"""
+    if crs is None or crs.is_geographic:
+        return 360.0 / (256 * 2 ** zoom)
+    return EARTH_CIRCUMFERENCE_M / (256 * 2 ** zoom)
+
+def fit_zoom(span, crs, viewport_px=1024):
+    """Web-map zoom at which an extent of ``span`` CRS units roughly fills the viewport"""
+    world = pixel_size_at_zoom(0, crs) * 256
+    return int(np.clip(np.floor(np.log2(world * viewport_px / (256 * max(span, 1e-9)))), 0, 22))
+
+def simplify_for_output(gdf, pixel_size):
+    """
+    Return ``gdf`` with geometries from the coarsest pyramid level that is still sub-pixel.
+
+    The pyramid is built once per distinct set of geometries and cached; point layers and
+    outputs finer than the finest level are returned unchanged.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Features to draw.
+        pixel_size (float): Size of one output pixel in the units of the frame's CRS.
+    """
+    geoms = np.asarray(gdf.geometry.values)
+    type_ids = shapely.get_type_id(geoms)
+    if np.isin(type_ids, [shapely.GeometryType.POINT, shapely.GeometryType.MULTIPOINT, -1]).all():
+        return gdf
+
+    xmin, ymin, xmax, ymax = gdf.total_bounds
+    span = max(xmax - xmin, ymax - ymin)
+    if not np.isfinite(span) or span <= 0 or pixel_size < span * FINEST_TOLERANCE_FRACTION:
+        return gdf
+
+    pyramids = _get_pyramids()
+    key = geometry_fingerprint(gdf)
+    pyramid = pyramids.get(key)
+    if pyramid is None:
+        levels = current_app.config['LOD_LEVELS'] if has_app_context() else 8
+        pyramid = build_pyramid(geoms, span, levels)
+        pyramids.put(key, pyramid)
+
+    chosen = None
+    for tolerance, level_geoms in pyramid:
+        if tolerance <= pixel_size:
+            chosen = level_geoms
+    if chosen is None:
+        return gdf
+
+    simplified = gdf.copy()
+    simplified[gdf.geometry.name] = gpd.GeoSeries(chosen, index=gdf.index, crs=gdf.crs)
+    return simplified
+
+def cache_stats():
+    return _get_pyramids().stats()
@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from flask import current_app, has_app_context
+from app.utils.lru_cache import prune_directory
+from app.utils.dataset_cache import file_hash
+from app.utils.raster_processor import calculate_index
+
+_stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+# Striped locks so concurrent requests for the same index compute it only once; a
+# fixed set keeps memory bounded, at the cost of rare waits between unrelated keys
+_key_locks = tuple(threading.Lock() for _ in range(64))
+
+def _cache_dir():
+    if not has_app_context():
+        return None
+    return current_app.config.get('INDEX_CACHE_DIR')
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def _key_lock(key):
+    return _key_locks[int(key[:8], 16) % len(_key_locks)]
+
+def index_key(raster_path, index_type, bands):
+    """Content-addressed key: the same pixels, index and band mapping always share an entry"""
+    payload = json.dumps([file_hash(raster_path), index_type, [int(band) for band in bands]])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def _open(path):
+    """Map a cached ``.npy`` read-only without loading it; returns None if it was evicted"""
+    try:
+        index_data = np.load(path, mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        return None
+    os.utime(path)  # Mark as recently used for disk eviction
+    return index_data
+
+def get_index(raster_path, index_type, bands):
+    """
+    Return a full-resolution index, reopening a cached result when one exists.
+
+    Results are stored as ``.npy`` files in INDEX_CACHE_DIR and returned as read-only
+    memmaps, so repeat statistics and exports page in only what they touch. Without
+    a cache directory the index is computed as before.
+    """
+    directory = _cache_dir()
+    if not directory:
+        return calculate_index(raster_path, index_type, bands)
+
+    key = index_key(raster_path, index_type, bands)
+    path = os.path.join(directory, f"{key}.npy")
+    index_data = _open(path)
+    if index_data is not None:
+        _count('hits')
+        return index_data
+
+    with _key_lock(key):
+        # Another request may have finished computing it while we waited
+        index_data = _open(path)
+        if index_data is not None:
+            _count('hits')
+            return index_data
+
+        _count('misses')
+        os.makedirs(directory, exist_ok=True)
+        # Compute into a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            result = calculate_index(raster_path, index_type, bands, out_path=tmp_path)
+            del result  # Release the writable mapping before publishing the file
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        _count('writes')
+
+        # Open before pruning: an open mapping stays valid even if the file is evicted
+        index_data = np.load(path, mmap_mode='r')
+        _count('evictions', prune_directory(
+            directory, current_app.config['INDEX_CACHE_MAX_BYTES'], suffix='.npy'
+        ))
+    return index_data
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    stats['enabled'] = bool(_cache_dir())
+    return stats
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from flask import current_app, has_app_context
+from app.utils.lru_cache import LRUCache
+
+_memory = None
+_memory_lock = threading.Lock()
+_local = threading.local()
+_stats = {'memory_hits': 0, 'shared_hits': 0, 'misses': 0, 'writes': 0, 'expired': 0}
+_stats_lock = threading.Lock()
+
+def _config(name, default):
+    """Read an app setting, falling back to ``default`` outside an application context"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def _get_memory():
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                # Sized in entries: every value counts as 1
+                _memory = LRUCache(_config('INTENT_CACHE_MEMORY_ENTRIES', 1024), sizeof=lambda value: 1)
+    return _memory
+
+def _connection():
+    """Per-thread SQLite connection to the shared store, or None when it is disabled"""
+    path = _config('INTENT_CACHE_PATH', None)
+    if not path:
+        return None
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.key != (path, os.getpid()):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        # WAL lets every worker read while one writes
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS intents ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS intents_created ON intents (created_at)')
+        _local.conn, _local.key = conn, (path, os.getpid())
+    return conn
+
+def normalize_message(message):
+    """Case-fold and collapse whitespace so trivially different phrasings share an entry"""
+    return ' '.join(message.casefold().split())
+
+def intent_key(message, columns, fingerprint=None):
+    """
+    Hash the inputs that determine the model's answer: the normalized message, the
+    dataset's column schema (in order, as shown in the prompt), the model name and
+    the ``fingerprint`` of the column profile whose values the prompt quotes.
+    """
+    payload = json.dumps(
+        [normalize_message(message), list(columns), _config('GENAI_MODEL', 'gemini-1.5-flash'), fingerprint],
+        ensure_ascii=False
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def get_intent(key):
+    """Return a cached (ai_response, column_names) tuple, or None"""
+    now = time.time()
+    entry = _get_memory().get(key)
+    if entry is not None:
+        if entry[1] > now:
+            _count('memory_hits')
+            return entry[0]
+        _get_memory().discard(key)
+        _count('expired')
+
+    conn = _connection()
+    if conn is not None:
+        row = conn.execute(
+            'SELECT response, expires_at FROM intents WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        if row is not None:
+            ai_response, column_names = json.loads(row[0])
+            result = (ai_response, column_names)
+            _get_memory().put(key, (result, row[1]))
+            _count('shared_hits')
+            return result
+
+    _count('misses')
+    return None
+
+def put_intent(key, result):
+    """
+    Store a parsed model answer for INTENT_CACHE_TTL seconds.
+
+    The shared store keeps at most INTENT_CACHE_MAX_ENTRIES rows; expired rows and
+    then the oldest ones are removed on write.
+    """
+    ai_response, column_names = result
+    now = time.time()
+    expires_at = now + _config('INTENT_CACHE_TTL', 24 * 3600)
+    _get_memory().put(key, ((ai_response, column_names), expires_at))
+    _count('writes')
+
+    conn = _connection()
+    if conn is None:
+        return
+    conn.execute(
+        'INSERT OR REPLACE INTO intents (key, response, created_at, expires_at) VALUES (?, ?, ?, ?)',
+        (key, json.dumps([ai_response, column_names], ensure_ascii=False), now, expires_at)
+    )
+    conn.execute('DELETE FROM intents WHERE expires_at <= ?', (now,))
+    conn.execute(
+        'DELETE FROM intents WHERE key IN '
+        '(SELECT key FROM intents ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+        (_config('INTENT_CACHE_MAX_ENTRIES', 10000),)
+    )
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['memory_hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_ratio'] = (stats['memory_hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+    stats['memory_entries'] = len(_get_memory())
+    conn = _connection()
+    stats['shared_entries'] = conn.execute('SELECT COUNT(*) FROM intents').fetchone()[0] if conn is not None else None
+    return stats
+
+def clear_cache():
+    _get_memory().clear()
+    conn = _connection()
+    if conn is not None:
+        conn.execute('DELETE FROM intents')
@@ -0,0 +1,207 @@
+import re
+import threading
+from difflib import SequenceMatcher
+from flask import current_app, has_app_context
+
+# Keywords process_query uses to decide whether to render a map and/or statistics
+MAP_KEYWORDS = ('map', 'visualize', 'heatmap')
+STATS_KEYWORDS = ('statistics', 'stats', 'plot', 'chart')
+
+# Openings of conceptual questions, which need the model rather than a column lookup
+_QUESTION_PATTERN = re.compile(r"^\s*(what|why|how|who|when|which|explain|describe|define|tell me about)\b", re.IGNORECASE)
+# Parts of a message that name columns without mapping them: filters, extents and titles
+_IGNORED_PATTERNS = (
+    re.compile(r"\bwhere\b.*?(?:[,;\n]|\.\s|\.$|$)", re.IGNORECASE | re.DOTALL),
+    re.compile(r"\bbbox\b[^a-z]*", re.IGNORECASE),
+    re.compile(r"\b(?:legend )?title\b[^.]*", re.IGNORECASE),
+)
+_WORD = re.compile(r"[a-z0-9]+")
+# Request wording that says nothing about which column is meant
+_FILLER_WORDS = set(MAP_KEYWORDS + STATS_KEYWORDS) | {
+    'the', 'and', 'for', 'with', 'from', 'show', 'make', 'create', 'generate', 'give', 'please',
+    'can', 'you', 'interactive', 'static', 'dynamic', 'choropleth', 'data', 'column', 'columns', 'field'
+}
+
+_stats = {'resolved': 0, 'deferred': 0}
+_stats_lock = threading.Lock()
+
+def _config(name, default):
+    """Read an app setting, falling back to ``default`` outside an application context"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+def _words(text):
+    return _WORD.findall(text.lower())
+
+def _phrases(words, longest=3):
+    """Runs of one to ``longest`` consecutive words, joined without separators"""
+    return {''.join(words[i:i + n]) for n in range(1, longest + 1) for i in range(len(words) - n + 1)}
+
+def _fuzzy_scores(columns, phrases, cutoff):
+    """Best difflib ratio of each column name against the phrases, for scores >= cutoff"""
+    scores = {}
+    matcher = SequenceMatcher(autojunk=False)
+    for column in columns:
+        key = ''.join(_words(column))
+        if len(key) < 3:
+            continue
+        matcher.set_seq2(key)  # seq2 is the side SequenceMatcher preprocesses, so set it once
+        score = 0.0
+        for phrase in phrases:
+            matcher.set_seq1(phrase)
+            # The quick ratios are upper bounds; most phrases are rejected without the full match
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = max(score, matcher.ratio())
+        if score >= cutoff:
+            scores[column] = score
+    return scores
+
+def _names_column(lowered_text, column):
+    return re.search(rf"(?<![\w]){re.escape(column.lower())}(?![\w])", lowered_text) is not None
+
+def classify_request(message):
+    """
+    Keyword classification of a chat message.
+
+    Returns:
+        dict: 'map' and 'stats' flags (the same tests process_query applies) and the
+        map mode generate_map_response will pick: 'heatmap', 'interactive' or 'static'.
+    """
+    text = message.lower()
+    if 'heatmap' in text or 'density' in text:
+        mode = 'heatmap'
+    elif 'interactive' in text or 'dynamic' in text:
+        mode = 'interactive'
+    else:
+        mode = 'static'
+    return {
+        'map': any(keyword in text for keyword in MAP_KEYWORDS),
+        'stats': any(keyword in text for keyword in STATS_KEYWORDS),
+        'mode': mode
+    }
+
+def match_columns(message, columns, cutoff=0.85):
+    """
+    Columns the message refers to, with a confidence score for each.
+
+    A column named verbatim (case-insensitive, as a whole word or phrase) scores 1.0.
+    Only when nothing matches verbatim are runs of one to three words compared with
+    the column names, ignoring case, underscores and spaces, so "precipitation" finds
+    PRECIPITAT. Filter clauses, bbox extents and titles are not searched.
+
+    Returns:
+        list: (column, score) pairs, best first.
+    """
+    text = message
+    for pattern in _IGNORED_PATTERNS:
+        text = pattern.sub(' ', text)
+    lowered = text.lower()
+
+    exact = [column for column in columns if _names_column(lowered, column)]
+    # A name found only inside a longer matched name ("POPU" in "POPU DENSI") is not a separate match
+    exact = [column for column in exact if not any(
+        column != other and column.lower() in other.lower() for other in exact
+    )]
+    if exact:
+        return [(column, 1.0) for column in exact]
+
+    scores = _fuzzy_scores(columns, _phrases(_words(text)), cutoff)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def rank_columns(message, columns, limit, values=None):
+    """
+    Up to ``limit`` columns most relevant to the message, best first.
+
+    Scores combine verbatim mentions (1.0), shared words or word prefixes between the
+    message and the column name ("pop" and "population"), and fuzzy name similarity.
+    ``values`` optionally maps columns to their frequent values (from the dataset
+    profile); a column holding a value the message mentions ("in Punjab") scores 0.8.
+    Columns with nothing in common with the message are left out, so the result may
+    be shorter than ``limit`` or empty.
+    """
+    lowered = message.lower()
+    words = [word for word in _words(message) if word not in _FILLER_WORDS]
+    message_words = {word for word in words if len(word) >= 3}
+    fuzzy = _fuzzy_scores(columns, _phrases(words), cutoff=0.6)
+
+    scored = []
+    for position, column in enumerate(columns):
+        if _names_column(lowered, column):
+            score = 1.0
+        else:
+            tokens = [token for token in _words(column) if len(token) >= 3]
+            shared = sum(
+                1 for token in tokens
+                if any(word.startswith(token) or token.startswith(word) for word in message_words)
+            )
+            score = max(0.9 * shared / len(tokens) if tokens else 0.0, fuzzy.get(column, 0.0))
+            if values and score < 0.8 and any(_names_column(lowered, value) for value in values.get(column, ())):
+                score = 0.8
+        if score > 0:
+            scored.append((-score, position, column))
+    return [column for _, _, column in sorted(scored)[:limit]]
+
+def parse_intent(message, columns, profile=None):
+    """
+    Resolve a map or statistics request without the model when the answer is unambiguous.
+
+    Returns an ``(ai_response, column_names)`` tuple shaped like process_user_query's,
+    or None when the message is a question, asks for neither a map nor statistics, or
+    does not single out a column with at least INTENT_LOCAL_MIN_CONFIDENCE. With the
+    dataset ``profile``, a map request matching several columns alike is still
+    resolved when only one of them is numeric.
+    """
+    if not _config('INTENT_LOCAL_PARSER', True) or not columns:
+        return None
+    request_type = classify_request(message)
+    if not (request_type['map'] or request_type['stats']) or _QUESTION_PATTERN.match(message):
+        _count('deferred')
+        return None
+
+    min_confidence = _config('INTENT_LOCAL_MIN_CONFIDENCE', 0.85)
+    matches = match_columns(message, columns, cutoff=min_confidence)
+    if not matches:
+        _count('deferred')
+        return None
+    if request_type['map']:
+        # A map shows one column; two candidates scoring alike are left to the model
+        if len(matches) > 1 and matches[1][1] >= matches[0][1] - 0.05:
+            tied = [match for match in matches if match[1] >= matches[0][1] - 0.05]
+            numeric = [
+                match for match in tied
+                if profile and profile['columns'].get(match[0], {}).get('numeric')
+            ]
+            if len(numeric) != 1:
+                _count('deferred')
+                return None
+            matches = numeric
+        matches = matches[:1]
+    column_names = [column for column, _ in matches]
+    names = ', '.join(column_names)
+
+    if request_type['map']:
+        descriptions = {
+            'heatmap': f"🔥 Here's a heatmap of {names}.",
+            'interactive': f"🗺️ Here's an interactive map of {names}.",
+            'static': f"🗺️ Here's a map of {names}."
+        }
+        ai_response = descriptions[request_type['mode']]
+        if request_type['stats']:
+            ai_response += " 📊 Statistics are included below."
+    else:
+        ai_response = f"📊 Here are the statistics for {names}."
+
+    _count('resolved')
+    return ai_response, column_names
+
+def parser_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['resolved'] + stats['deferred']
+    stats['resolved_ratio'] = stats['resolved'] / total if total else 0.0
+    return stats
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+class MemoryJobStore:
+    """Job records kept in this process; only the process that started a job can report it"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id] = dict(fields, job_id=job_id)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def prune(self, older_than):
+        """Forget jobs that finished before ``older_than`` (a Unix time)"""
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items() if (job.get('finished_at') or time.time()) < older_than]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """
+    Job records in a SQLite file, so any web worker on the host can report any job.
+
+    Every store is one ``table`` with a job_id key and the given ``fields``; fields in
+    ``json_fields`` hold JSON-encoded values. A ``finished_at`` field is needed for
+    ``prune``. Fields missing from an existing table are added on open.
+    """
+
+    def __init__(self, path, table, fields, json_fields=()):
+        self.path = path
+        self.table = table
+        self.fields = tuple(fields)
+        self.json_fields = set(json_fields)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (job_id TEXT PRIMARY KEY, {', '.join(self.fields)})")
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for field in self.fields:
+            if field not in existing:
+                # Tables created by an earlier version
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {field}')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _encode(self, fields):
+        return {
+            name: json.dumps(value) if name in self.json_fields and value is not None else value
+            for name, value in fields.items()
+        }
+
+    def create(self, job_id, **fields):
+        fields = self._encode(fields)
+        names = ', '.join(('job_id',) + tuple(fields))
+        placeholders = ', '.join('?' * (len(fields) + 1))
+        self._connection().execute(
+            f'INSERT INTO {self.table} ({names}) VALUES ({placeholders})', (job_id,) + tuple(fields.values())
+        )
+
+    def update(self, job_id, **fields):
+        fields = self._encode(fields)
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._connection().execute(
+            f'UPDATE {self.table} SET {assignments} WHERE job_id = ?', tuple(fields.values()) + (job_id,)
+        )
+
+    def get(self, job_id):
+        row = self._connection().execute(
+            f"SELECT {', '.join(self.fields)} FROM {self.table} WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.fields, row), job_id=job_id)
+        for name in self.json_fields:
+            if job[name] is not None:
+                job[name] = json.loads(job[name])
+        return job
+
+    def prune(self, older_than):
+        """Delete jobs that finished before ``older_than`` (a Unix time)"""
+        self._connection().execute(f'DELETE FROM {self.table} WHERE finished_at < ?', (older_than,))
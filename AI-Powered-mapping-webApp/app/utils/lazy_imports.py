@@ -0,0 +1,117 @@
+import sys
+import time
+import importlib
+import threading
+
+# Imported by the background warm-up, dependencies first so each time is mostly the module's own
+WARM_UP_MODULES = (
+    'numpy', 'pandas', 'shapely', 'pyproj', 'geopandas', 'rasterio', 'matplotlib.pyplot',
+    'branca', 'folium', 'mapclassify', 'google.generativeai',
+    'app.utils.dataset_cache', 'app.utils.file_processor', 'app.utils.map_generator',
+    'app.utils.ai_handler', 'app.utils.raster_processor', 'app.utils.raster_tiles',
+    'app.utils.zonal_stats', 'app.utils.raster_timeseries'
+)
+
+_imports = {}
+_report = {'create_app_seconds': None, 'warm_up': 'not started', 'warm_up_seconds': None}
+_lock = threading.Lock()
+
+def timed_import(name, trigger):
+    """Import a module, recording how long it took and what caused it if it was not loaded yet"""
+    module = sys.modules.get(name)
+    if module is not None and name in _imports:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        # Modules already pulled in by an earlier import show up with (near) zero time
+        _imports.setdefault(name, {'seconds': round(elapsed, 4), 'trigger': trigger})
+    return module
+
+
+class LazyModule:
+    """Stand-in for a module that is imported the first time one of its attributes is used"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = timed_import(self._name, trigger='first use')
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
+
+def lazy_functions(module_name, *names):
+    """
+    Callables standing in for functions of ``module_name``, which is imported on the
+    first call of any of them. Returns one callable per name, in order (the callable
+    itself for a single name).
+    """
+    module = LazyModule(module_name)
+
+    def make(name):
+        def call(*args, **kwargs):
+            return getattr(module, name)(*args, **kwargs)
+        call.__name__ = call.__qualname__ = name
+        call.__doc__ = f"Calls {module_name}.{name}, importing the module on first use."
+        return call
+
+    functions = tuple(make(name) for name in names)
+    return functions if len(functions) > 1 else functions[0]
+
+def record_create_app(seconds):
+    _report['create_app_seconds'] = round(seconds, 4)
+
+def start_warm_up(app, modules=WARM_UP_MODULES):
+    """
+    Import the heavy modules on a background thread after start-up, then start the
+    render pool when RENDER_WORKERS is set, so the first requests find them loaded.
+    Failures are logged and leave the module to load on first use.
+    """
+    def run():
+        _report['warm_up'] = 'running'
+        started = time.perf_counter()
+        for name in modules:
+            try:
+                timed_import(name, trigger='warm-up')
+            except Exception as e:
+                app.logger.warning(f"Warm-up import of {name} failed: {e}")
+        if app.config.get('RENDER_WORKERS'):
+            from app.utils import render_jobs
+            with app.app_context():
+                render_jobs.get_pool()
+        _report['warm_up_seconds'] = round(time.perf_counter() - started, 4)
+        _report['warm_up'] = 'done'
+        app.logger.info(format_report())
+
+    threading.Thread(target=run, daemon=True, name='warm-up').start()
+
+def startup_report():
+    """create_app time, warm-up state and per-module import times, slowest first"""
+    with _lock:
+        imports = sorted(
+            ({'module': name, **entry} for name, entry in _imports.items()),
+            key=lambda entry: entry['seconds'], reverse=True
+        )
+    return dict(_report, imports=imports)
+
+def format_report():
+    report = startup_report()
+    warm_up = report['warm_up']
+    if report['warm_up_seconds'] is not None:
+        warm_up += f" in {report['warm_up_seconds']}s"
+    lines = [f"create_app: {report['create_app_seconds']}s, warm-up: {warm_up}"]
+    lines += [f"  {entry['seconds']:8.4f}s  {entry['module']} ({entry['trigger']})" for entry in report['imports']]
+    return '\n'.join(lines)
@@ -0,0 +1,175 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.generativeai import client as genai_client
+from google.api_core import exceptions as api_exceptions
+from requests import exceptions as http_exceptions
+from flask import current_app, has_app_context
+
+# Failures worth another attempt; anything else (bad key, invalid request) is raised at once
+RETRYABLE_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    http_exceptions.ConnectionError,
+    http_exceptions.Timeout,
+)
+
+_client = None
+_client_key = None
+_executor = None
+_lock = threading.Lock()
+_stats = {
+    'calls': 0, 'attempts': 0, 'retries': 0, 'timeouts': 0, 'failures': 0, 'in_flight': 0,
+    'finished': 0, 'prompt_tokens': 0, 'response_tokens': 0, 'latency_ms': 0.0
+}
+_recent_calls = deque(maxlen=50)
+_stats_lock = threading.Lock()
+
+def _config(name, default):
+    """Read an app setting, falling back to ``default`` outside an application context"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def get_client(api_key):
+    """
+    Return the process-wide Gemini client, configuring the SDK only when needed.
+
+    The client is rebuilt if the key, endpoint or transport changes, or in a forked
+    child process (connection pools must not be shared across a fork).
+    GENAI_API_ENDPOINT points the client at another server, e.g. a local stub.
+    """
+    global _client, _client_key, _executor
+    endpoint = _config('GENAI_API_ENDPOINT', None)
+    transport = _config('GENAI_TRANSPORT', 'rest')
+    key = (api_key, endpoint, transport, os.getpid())
+    if _client is None or _client_key != key:
+        with _lock:
+            if _client is None or _client_key != key:
+                client_options = {'api_endpoint': endpoint} if endpoint else None
+                genai.configure(api_key=api_key, transport=transport, client_options=client_options)
+                _client = genai_client.get_default_generative_client()
+                if _client_key is not None and _client_key[3] != key[3]:
+                    _executor = None  # Threads of the parent process do not exist here
+                _client_key = key
+    return _client
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_config('LLM_MAX_CONCURRENCY', 8),
+                    thread_name_prefix='llm'
+                )
+    return _executor
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for prompts the API does not meter"""
+    return max(1, len(text) // 4)
+
+def _record_call(prompt, text, response, started, attempts, details):
+    """Add one finished call to the totals and the recent-call log"""
+    if text is None:
+        response_tokens = 0
+    elif response.candidates and response.candidates[0].token_count:
+        response_tokens = response.candidates[0].token_count  # Reported when the server provides it
+    else:
+        response_tokens = estimate_tokens(text)
+    record = dict(
+        details or {},
+        prompt_tokens=estimate_tokens(prompt),
+        response_tokens=response_tokens,
+        latency_ms=round((time.perf_counter() - started) * 1000, 1),
+        attempts=attempts,
+        ok=text is not None
+    )
+    with _stats_lock:
+        _stats['finished'] += 1
+        _stats['prompt_tokens'] += record['prompt_tokens']
+        _stats['response_tokens'] += record['response_tokens']
+        _stats['latency_ms'] += record['latency_ms']
+        _recent_calls.append(record)
+
+def _call(client, request, timeout):
+    _count('in_flight')
+    try:
+        # retry=None: the client's built-in retry would run past our timeout; retries happen below
+        return client.generate_content(request, retry=None, timeout=timeout)
+    finally:
+        _count('in_flight', -1)
+
+def generate_text(prompt, api_key, details=None):
+    """
+    Send one prompt to the configured model and return the response text.
+
+    Calls run on a bounded thread pool (LLM_MAX_CONCURRENCY), so a burst of chat
+    messages cannot open an unbounded number of connections. LLM_TIMEOUT is one
+    deadline for the whole call, including time spent waiting for a free slot and
+    every retry. Transient failures are retried up to LLM_MAX_RETRIES times with
+    exponential backoff and jitter while time remains; a timed-out attempt is never
+    retried, as it may still hold its slot.
+
+    Token counts and latency of every call are recorded together with ``details``
+    (e.g. how many columns the prompt listed) and reported by ``llm_stats``.
+    """
+    client = get_client(api_key)
+    timeout = _config('LLM_TIMEOUT', 30)
+    max_retries = _config('LLM_MAX_RETRIES', 2)
+    backoff = _config('LLM_RETRY_BACKOFF', 0.5)
+    request = glm.GenerateContentRequest(
+        model=f"models/{_config('GENAI_MODEL', 'gemini-1.5-flash')}",
+        contents=[glm.Content(role='user', parts=[glm.Part(text=prompt)])]
+    )
+
+    _count('calls')
+    started = time.perf_counter()
+    deadline = started + timeout
+    for attempt in range(max_retries + 1):
+        _count('attempts')
+        remaining = deadline - time.perf_counter()
+        future = _get_executor().submit(_call, client, request, remaining)
+        try:
+            response = future.result(timeout=remaining)
+            text = genai.types.GenerateContentResponse.from_response(response).text
+            _record_call(prompt, text, response, started, attempt + 1, details)
+            return text
+        except FutureTimeout as e:
+            future.cancel()  # Drops the call if it never left the queue
+            _count('timeouts')
+            _count('failures')
+            _record_call(prompt, None, None, started, attempt + 1, details)
+            raise TimeoutError(f"No response from the model within {timeout}s") from e
+        except RETRYABLE_ERRORS:
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            if attempt == max_retries or time.perf_counter() + delay >= deadline:
+                _count('failures')
+                _record_call(prompt, None, None, started, attempt + 1, details)
+                raise
+            _count('retries')
+            time.sleep(delay)
+        except Exception:
+            _count('failures')
+            _record_call(prompt, None, None, started, attempt + 1, details)
+            raise
+
+def llm_stats():
+    with _stats_lock:
+        stats = dict(_stats, recent_calls=list(_recent_calls))
+    finished = stats['finished']
+    stats['mean_latency_ms'] = round(stats['latency_ms'] / finished, 1) if finished else 0.0
+    stats['mean_prompt_tokens'] = round(stats['prompt_tokens'] / finished, 1) if finished else 0.0
+    return stats
@@ -0,0 +1,78 @@
+import re
+
+# Operators accepted in "where" clauses, mapped to the form used by the dataset readers
+FILTER_OPERATORS = {
+    '=': '=',
+    '==': '=',
+    'is': '=',
+    '!=': '!=',
+    '<>': '!=',
+    'is not': '!=',
+    '>': '>',
+    '>=': '>=',
+    '<': '<',
+    '<=': '<=',
+}
+
+_CONDITION_PATTERN = re.compile(
+    r"^\s*(?P<column>.+?)\s*(?P<op>>=|<=|!=|<>|==|=|>|<|\bis not\b|\bis\b)\s*(?P<value>.+?)\s*$",
+    re.IGNORECASE
+)
+_NUMBER = r"-?\d+(?:\.\d+)?"
+_BBOX_PATTERN = re.compile(
+    rf"\bbbox\s*[(\[]?\s*({_NUMBER})\s*,\s*({_NUMBER})\s*,\s*({_NUMBER})\s*,\s*({_NUMBER})",
+    re.IGNORECASE
+)
+
+
+class FilterError(ValueError):
+    """A filter condition that cannot be applied to its column, e.g. a word compared with a number"""
+
+
+def _parse_value(raw):
+    """Strip quotes and convert numeric literals"""
+    value = raw.strip().strip('"\'')
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() and '.' not in value else number
+
+def parse_attribute_filters(message, columns):
+    """
+    Extract attribute conditions such as "where PROVINCE = Punjab and POPULATION > 1000".
+
+    Args:
+        message (str): The user's message.
+        columns (list): Column names of the current dataset; conditions on unknown columns are ignored.
+
+    Returns:
+        list: (column, operator, value) tuples that must all hold, empty when no filter was given.
+    """
+    match = re.search(r"\bwhere\b\s+(.*)", message, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return []
+
+    # The clause ends at the next comma, semicolon, line break or sentence end
+    clause = re.split(r"[,;\n]|\.\s|\.$", match.group(1))[0]
+    columns_by_name = {col.lower(): col for col in columns}
+
+    filters = []
+    for condition in re.split(r"\s+and\s+", clause, flags=re.IGNORECASE):
+        parsed = _CONDITION_PATTERN.match(condition)
+        if not parsed:
+            continue
+        column = columns_by_name.get(parsed.group('column').strip().lower())
+        if column is None:
+            continue
+        operator = FILTER_OPERATORS[parsed.group('op').lower()]
+        filters.append((column, operator, _parse_value(parsed.group('value'))))
+    return filters
+
+def parse_bbox(message):
+    """Extract a "bbox minx, miny, maxx, maxy" extent from the message, if any"""
+    match = _BBOX_PATTERN.search(message)
+    if not match:
+        return None
+    minx, miny, maxx, maxy = (float(v) for v in match.groups())
+    return (min(minx, maxx), min(miny, maxy), max(minx, maxx), max(miny, maxy))
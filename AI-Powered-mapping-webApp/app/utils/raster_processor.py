@@ -1,105 +1,334 @@
-import rasterio
-import numpy as np
-import matplotlib.pyplot as plt
-from io import BytesIO
-import base64
-
-def calculate_index(raster_path, index_type, bands):
-    with rasterio.open(raster_path) as src:
-        band_data = {band: src.read(band) for band in bands}
-        
-        if index_type == 'NDVI':
-            nir, red = band_data[bands[0]], band_data[bands[1]]
-            ndvi = (nir.astype(float) - red.astype(float)) / (nir + red + 1e-10)
-            return ndvi
-            
-        elif index_type == 'NDWI':
-            green, nir = band_data[bands[0]], band_data[bands[1]]
-            ndwi = (green.astype(float) - nir.astype(float)) / (green + nir + 1e-10)
-            return ndwi
-            
-        elif index_type == 'SAWI':
-            nir, swir = band_data[bands[0]], band_data[bands[1]]
-            sawi = (nir.astype(float) - swir.astype(float)) / (nir + swir + 1e-10)
-            return sawi
-
-def create_raster_visualization(index_data, index_type):
-    fig, ax = plt.subplots(figsize=(10, 8))
-    
-    if index_type == 'NDVI':
-        cmap = 'YlGn'
-        vmin, vmax = -1, 1
-    elif index_type == 'NDWI':
-        cmap = 'Blues'
-        vmin, vmax = -1, 1
-    else:  # SAWI
-        cmap = 'RdYlBu'
-        vmin, vmax = -1, 1
-    
-    img = ax.imshow(index_data, cmap=cmap, vmin=vmin, vmax=vmax)
-    plt.colorbar(img, ax=ax, label=index_type)
-    ax.set_title(f'{index_type} Visualization')
-    ax.axis('off')
-    
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', dpi=100)
-    plt.close()
-    buf.seek(0)
-    
-    return f"data:image/png;base64,{base64.b64encode(buf.read()).decode('utf-8')}"
-
-# import rasterio
-# import numpy as np
-# from rasterio.plot import reshape_as_image
-# import matplotlib.pyplot as plt
-# from io import BytesIO
-# import base64
-
-# def calculate_index(raster_path, index_type, bands):
-#     with rasterio.open(raster_path) as src:
-#         band_data = {band: src.read(band) for band in bands}
-        
-#         if index_type == 'NDVI':
-#             # NDVI = (NIR - Red) / (NIR + Red)
-#             nir, red = band_data[bands[0]], band_data[bands[1]]
-#             ndvi = (nir.astype(float) - red.astype(float)) / (nir + red)
-#             return ndvi
-            
-#         elif index_type == 'NDWI':
-#             # NDWI = (Green - NIR) / (Green + NIR)
-#             green, nir = band_data[bands[0]], band_data[bands[1]]
-#             ndwi = (green.astype(float) - nir.astype(float)) / (green + nir)
-#             return ndwi
-            
-#         elif index_type == 'SAWI':
-#             # SAWI = (NIR - SWIR) / (NIR + SWIR)
-#             nir, swir = band_data[bands[0]], band_data[bands[1]]
-#             sawi = (nir.astype(float) - swir.astype(float)) / (nir + swir)
-#             return sawi
-
-# def create_raster_visualization(index_data, index_type):
-#     fig, ax = plt.subplots(figsize=(10, 10))
-    
-#     # Create color map based on index type
-#     if index_type == 'NDVI':
-#         cmap = 'YlGn'
-#         vmin, vmax = -1, 1
-#     elif index_type == 'NDWI':
-#         cmap = 'Blues'
-#         vmin, vmax = -1, 1
-#     else:  # SAWI
-#         cmap = 'RdYlBu'
-#         vmin, vmax = -1, 1
-    
-#     img = ax.imshow(index_data, cmap=cmap, vmin=vmin, vmax=vmax)
-#     plt.colorbar(img, ax=ax, label=index_type)
-#     ax.set_title(f'{index_type} Visualization')
-#     ax.axis('off')
-    
-#     # Save to buffer
-#     buf = BytesIO()
-#     plt.savefig(buf, format='png', bbox_inches='tight', dpi=100)
-#     plt.close()
-#     buf.seek(0)
-    
+import rasterio
+from rasterio.windows import Window
+from rasterio.enums import Resampling
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.colorbar import ColorbarBase
+from matplotlib.colors import Normalize
+from PIL import Image
+from io import BytesIO
+import base64
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+from app.utils.band_math import INDEX_DEFINITIONS, compile_index
+
+# Built-in indices; any other index_type is treated as a custom b<N> band-math expression
+SUPPORTED_INDICES = tuple(INDEX_DEFINITIONS)
+# Matplotlib colormap and value range used to display each index
+INDEX_COLORMAPS = {
+    'NDVI': ('YlGn', -1, 1),
+    'NDWI': ('Blues', -1, 1),
+    'SAWI': ('RdYlBu', -1, 1),
+    'EVI': ('YlGn', -1, 1),
+    'SAVI': ('YlGn', -1, 1),
+    'NBR': ('RdYlGn', -1, 1)
+}
+CUSTOM_INDEX_COLORMAP = ('RdYlGn', -1, 1)
+_luts = {}
+_legends = {}
+_legends_lock = threading.Lock()
+
+def _config(name, default):
+    """Read an app setting, falling back to ``default`` outside an application context"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def iter_windows(src, target_size=1024):
+    """
+    Yield windows covering the raster, aligned to its internal blocks.
+
+    Small blocks (e.g. single-row strips) are grouped so each window spans roughly
+    ``target_size`` pixels per side; tiles larger than that are used as they are.
+    """
+    block_height, block_width = src.block_shapes[0]
+    step_y = max(block_height, (target_size // block_height) * block_height)
+    step_x = max(block_width, (target_size // block_width) * block_width)
+    for row in range(0, src.height, step_y):
+        for col in range(0, src.width, step_x):
+            yield Window(col, row, min(step_x, src.width - col), min(step_y, src.height - row))
+
+def allocate_output(shape, out_path=None, dtype=np.float32):
+    """Preallocate a result (float32 by default), on disk when it is too large to keep in memory"""
+    if out_path is not None:
+        return np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=shape)
+    if shape[0] * shape[1] > _config('RASTER_IN_MEMORY_MAX_PIXELS', 64 * 1024 * 1024):
+        # Anonymous scratch file: the mapping stays valid and the file is gone once it is released
+        scratch = tempfile.TemporaryFile(dir=_config('RASTER_SCRATCH_DIR', None))
+        return np.memmap(scratch, mode='w+', dtype=dtype, shape=shape)
+    return np.empty(shape, dtype=dtype)
+
+def prepare_index(src, index_type, bands):
+    """Compile an index and check that every band it reads exists in ``src``"""
+    expression = compile_index(index_type, bands)
+    if not expression.bands or any(not 1 <= band <= src.count for band in expression.bands):
+        raise ValueError(f"Bands must be between 1 and {src.count}")
+    return expression
+
+def read_index_bands(src, expression, **read_kwargs):
+    """Read every band an expression uses as float32, keyed by band number"""
+    return {band: src.read(band, out_dtype='float32', **read_kwargs) for band in expression.bands}
+
+def _index_window(src, window, expression, result):
+    """Evaluate one window of an index expression into ``result``"""
+    rows, cols = window.toslices()
+    expression.evaluate(read_index_bands(src, expression, window=window), result[rows, cols])
+
+def run_windows(raster_path, windows, func, workers):
+    """
+    Call ``func(src, window)`` for every window, optionally on a thread pool.
+
+    GDAL reads and NumPy arithmetic release the GIL, so windows scale across cores.
+    Dataset handles are not thread-safe, so each worker thread opens its own.
+    """
+    if workers <= 1:
+        with rasterio.open(raster_path) as src:
+            for window in windows:
+                func(src, window)
+        return
+
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def run(window):
+        src = getattr(local, 'src', None)
+        if src is None:
+            src = local.src = rasterio.open(raster_path)
+            with handles_lock:
+                handles.append(src)
+        func(src, window)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Consume the iterator so worker exceptions propagate
+            for _ in pool.map(run, windows):
+                pass
+    finally:
+        for src in handles:
+            src.close()
+
+def calculate_index(raster_path, index_type, bands, out_path=None, workers=None):
+    """
+    Compute a spectral index window by window in float32.
+
+    ``index_type`` is a built-in index whose band roles are filled from ``bands``, or a
+    custom expression such as ``(b8 - b4) / (b8 + b4)``. The formula is compiled once
+    and evaluated in a single fused pass per window. Windows follow the raster's
+    internal tiling, so peak memory is a few blocks of input per worker regardless of
+    scene size. The result is written into a preallocated array, a scratch memmap for
+    very large scenes, or an ``.npy`` memmap at ``out_path``. ``workers`` (default:
+    the RASTER_WORKERS setting) threads process windows in parallel, each writing its
+    own slice of the result.
+    """
+    if workers is None:
+        workers = _config('RASTER_WORKERS', 1)
+
+    with rasterio.open(raster_path) as src:
+        expression = prepare_index(src, index_type, bands)
+        result = allocate_output((src.height, src.width), out_path)
+        windows = list(iter_windows(src, _config('RASTER_WINDOW_SIZE', 1024)))
+
+    run_windows(raster_path, windows, lambda src, window: _index_window(src, window, expression, result), workers)
+
+    if isinstance(result, np.memmap):
+        result.flush()
+    return result
+
+def preview_shape(height, width, max_size):
+    """Output shape that fits ``max_size`` pixels on the longer side, never upsampling"""
+    scale = min(1.0, max_size / max(height, width))
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+def calculate_index_preview(raster_path, index_type, bands, max_size=None):
+    """
+    Compute an index at display resolution only.
+
+    Decimated reads are served by GDAL from the overview level matching the output
+    size, so the cost depends on the preview size rather than the scene size.
+    """
+    if max_size is None:
+        max_size = _config('RASTER_PREVIEW_MAX_SIZE', 1000)
+
+    with rasterio.open(raster_path) as src:
+        expression = prepare_index(src, index_type, bands)
+        out_shape = preview_shape(src.height, src.width, max_size)
+        band_data = read_index_bands(src, expression, out_shape=out_shape, resampling=Resampling.average)
+
+    return expression.evaluate(band_data, np.empty(out_shape, dtype=np.float32))
+
+def index_statistics(index_data, chunk_rows=1024):
+    """Summary statistics of an index array, accumulated in row chunks to bound memory"""
+    count = 0
+    total = 0.0
+    total_sq = 0.0
+    minimum = np.inf
+    maximum = -np.inf
+    for start in range(0, index_data.shape[0], chunk_rows):
+        chunk = np.asarray(index_data[start:start + chunk_rows])
+        values = chunk[np.isfinite(chunk)].astype(np.float64)
+        if values.size == 0:
+            continue
+        count += values.size
+        total += values.sum()
+        total_sq += np.square(values).sum()
+        minimum = min(minimum, values.min())
+        maximum = max(maximum, values.max())
+
+    if count == 0:
+        return {'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None}
+    mean = total / count
+    return {
+        'count': count,
+        'mean': mean,
+        'std': float(np.sqrt(max(total_sq / count - mean * mean, 0.0))),
+        'min': float(minimum),
+        'max': float(maximum)
+    }
+
+def export_index(raster_path, index_data, out_path):
+    """Write a full-resolution index as a tiled float32 GeoTIFF georeferenced like the source"""
+    with rasterio.open(raster_path) as src:
+        profile = src.profile.copy()
+        windows = list(iter_windows(src, _config('RASTER_WINDOW_SIZE', 1024)))
+
+    profile.update(
+        driver='GTiff', count=1, dtype='float32', nodata=None,
+        tiled=True, blockxsize=512, blockysize=512, compress='deflate', bigtiff='IF_SAFER'
+    )
+    profile.pop('photometric', None)
+    with rasterio.open(out_path, 'w', **profile) as dst:
+        for window in windows:
+            rows, cols = window.toslices()
+            dst.write(np.asarray(index_data[rows, cols]), 1, window=window)
+    return out_path
+
+def colormap_lut(cmap_name):
+    """256-entry RGBA lookup table for a matplotlib colormap, built once per colormap"""
+    lut = _luts.get(cmap_name)
+    if lut is None:
+        lut = (matplotlib.colormaps[cmap_name](np.linspace(0, 1, 256)) * 255).round().astype(np.uint8)
+        _luts[cmap_name] = lut
+    return lut
+
+def colorize(index_data, index_type, mask=None):
+    """
+    Map index values to RGBA pixels through the colormap LUT of ``index_type``.
+
+    Non-finite values and pixels where ``mask`` is False are made transparent.
+    """
+    cmap_name, vmin, vmax = INDEX_COLORMAPS.get(index_type, CUSTOM_INDEX_COLORMAP)
+    # Quantize to uint8 LUT codes in one float32 buffer
+    scaled = np.subtract(index_data, vmin, dtype=np.float32)
+    scaled *= 255 / (vmax - vmin)
+    transparent = ~np.isfinite(scaled)
+    scaled[transparent] = 0
+    np.clip(scaled, 0, 255, out=scaled)
+    rgba = colormap_lut(cmap_name)[scaled.astype(np.uint8)]
+    if mask is not None:
+        transparent |= ~mask
+    rgba[transparent, 3] = 0
+    return rgba
+
+def encode_image(rgba, image_format='png'):
+    """Encode an RGBA array as PNG (fast, lossless) or WebP bytes"""
+    buf = BytesIO()
+    image = Image.fromarray(rgba, 'RGBA')
+    if image_format == 'webp':
+        image.save(buf, format='WEBP', quality=85, method=0)
+    else:
+        image.save(buf, format='PNG', compress_level=1)
+    return buf.getvalue()
+
+def index_legend(index_type):
+    """
+    Colorbar for an index as a PNG data URL.
+
+    Legends only depend on the colormap, range and label, so each is drawn once with
+    matplotlib's object API (no pyplot global state) and cached.
+    """
+    cmap_name, vmin, vmax = INDEX_COLORMAPS.get(index_type, CUSTOM_INDEX_COLORMAP)
+    label = index_type if index_type in INDEX_COLORMAPS else 'Custom index'
+    key = (cmap_name, vmin, vmax, label)
+    legend = _legends.get(key)
+    if legend is None:
+        fig = Figure(figsize=(0.9, 4), dpi=100)
+        ax = fig.add_axes([0.15, 0.05, 0.25, 0.9])
+        ColorbarBase(ax, cmap=matplotlib.colormaps[cmap_name], norm=Normalize(vmin, vmax), label=label)
+        buf = BytesIO()
+        fig.savefig(buf, format='png', transparent=True)
+        legend = f"data:image/png;base64,{base64.b64encode(buf.getvalue()).decode('utf-8')}"
+        with _legends_lock:
+            _legends[key] = legend
+    return legend
+
+def create_raster_visualization(index_data, index_type, image_format=None):
+    """
+    Render an index array as an image data URL.
+
+    Values are quantized to uint8 and colored through the cached colormap LUT, then
+    encoded directly; the legend comes separately from ``index_legend``.
+    """
+    if image_format is None:
+        image_format = _config('RASTER_PREVIEW_FORMAT', 'png')
+    image = encode_image(colorize(index_data, index_type), image_format)
+    return f"data:image/{image_format};base64,{base64.b64encode(image).decode('utf-8')}"
+
+# import rasterio
+# import numpy as np
+# from rasterio.plot import reshape_as_image
+# import matplotlib.pyplot as plt
+# from io import BytesIO
+# import base64
+
+# def calculate_index(raster_path, index_type, bands):
+#     with rasterio.open(raster_path) as src:
+#         band_data = {band: src.read(band) for band in bands}
+        
+#         if index_type == 'NDVI':
+#             # NDVI = (NIR - Red) / (NIR + Red)
+#             nir, red = band_data[bands[0]], band_data[bands[1]]
+#             ndvi = (nir.astype(float) - red.astype(float)) / (nir + red)
+#             return ndvi
+            
+#         elif index_type == 'NDWI':
+#             # NDWI = (Green - NIR) / (Green + NIR)
+#             green, nir = band_data[bands[0]], band_data[bands[1]]
+#             ndwi = (green.astype(float) - nir.astype(float)) / (green + nir)
+#             return ndwi
+            
+#         elif index_type == 'SAWI':
+#             # SAWI = (NIR - SWIR) / (NIR + SWIR)
+#             nir, swir = band_data[bands[0]], band_data[bands[1]]
+#             sawi = (nir.astype(float) - swir.astype(float)) / (nir + swir)
+#             return sawi
+
+# def create_raster_visualization(index_data, index_type):
+#     fig, ax = plt.subplots(figsize=(10, 10))
+    
+#     # Create color map based on index type
+#     if index_type == 'NDVI':
+#         cmap = 'YlGn'
+#         vmin, vmax = -1, 1
+#     elif index_type == 'NDWI':
+#         cmap = 'Blues'
+#         vmin, vmax = -1, 1
+#     else:  # SAWI
+#         cmap = 'RdYlBu'
+#         vmin, vmax = -1, 1
+    
+#     img = ax.imshow(index_data, cmap=cmap, vmin=vmin, vmax=vmax)
+#     plt.colorbar(img, ax=ax, label=index_type)
+#     ax.set_title(f'{index_type} Visualization')
+#     ax.axis('off')
+    
+#     # Save to buffer
+#     buf = BytesIO()
+#     plt.savefig(buf, format='png', bbox_inches='tight', dpi=100)
+#     plt.close()
+#     buf.seek(0)
+    
 #     return f"data:image/png;base64,{base64.b64encode(buf.read()).decode('utf-8')}"
\ No newline at end of file
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import numpy as np
+import rasterio
+from rasterio.vrt import WarpedVRT
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds
+from rasterio.warp import transform_bounds
+from urllib.parse import quote
+from flask import current_app
+from app.utils.lru_cache import LRUCache
+from app.utils.dataset_cache import file_key
+from app.utils.vector_tiles import tile_bounds
+from app.utils.raster_processor import prepare_index, read_index_bands, colorize, encode_image
+
+TILE_SIZE = 256
+WEB_MERCATOR = 'EPSG:3857'
+
+_tiles = None
+_tiles_lock = threading.Lock()
+_empty_tile = None
+
+def _get_cache():
+    global _tiles
+    if _tiles is None:
+        with _tiles_lock:
+            if _tiles is None:
+                _tiles = LRUCache(current_app.config['RASTER_TILE_CACHE_MAX_BYTES'])
+    return _tiles
+
+def _transparent_tile():
+    global _empty_tile
+    if _empty_tile is None:
+        _empty_tile = encode_image(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+    return _empty_tile
+
+def raster_tile_url_template(raster, index_type, bands):
+    """Leaflet URL template for the raster tile endpoint of one index"""
+    band_list = ','.join(str(int(band)) for band in bands)
+    return f"/raster-tiles/{quote(raster)}/{quote(index_type, safe='')}/{{z}}/{{x}}/{{y}}.png?bands={band_list}"
+
+def raster_bounds(raster_path):
+    """Raster extent as [[south, west], [north, east]] in WGS84, for fitting a web map"""
+    with rasterio.open(raster_path) as src:
+        west, south, east, north = transform_bounds(src.crs, 'EPSG:4326', *src.bounds)
+    return [[south, west], [north, east]]
+
+def _overview_level(src, tile_box):
+    """
+    Index of the coarsest overview whose pixels are still finer than the tile's.
+
+    Returns None when the tile needs full resolution.
+    """
+    minx, miny, maxx, maxy = transform_bounds(WEB_MERCATOR, src.crs, *tile_box)
+    tile_res = max(maxx - minx, maxy - miny) / TILE_SIZE
+    factor = tile_res / max(abs(src.res[0]), abs(src.res[1]))
+    level = None
+    for i, decimation in enumerate(src.overviews(1)):
+        if decimation <= factor:
+            level = i
+    return level
+
+def render_raster_tile(raster_path, index_type, bands, z, x, y):
+    """
+    Render one 256px PNG tile of a spectral index.
+
+    The source is opened at the overview level matching the zoom and warped straight
+    onto the tile grid, so each tile reads roughly a tile's worth of pixels whatever
+    the scene size. Pixels outside the raster or marked nodata are transparent.
+    """
+    tile_box = tile_bounds(z, x, y)
+    with rasterio.open(raster_path) as src:
+        expression = prepare_index(src, index_type, bands)
+        west, south, east, north = transform_bounds(src.crs, WEB_MERCATOR, *src.bounds)
+        if tile_box[0] >= east or tile_box[2] <= west or tile_box[1] >= north or tile_box[3] <= south:
+            return _transparent_tile()
+        level = _overview_level(src, tile_box)
+
+    open_options = {} if level is None else {'overview_level': level}
+    with rasterio.open(raster_path, **open_options) as src:
+        coverage = {'add_alpha': True} if src.nodata is None else {'nodata': src.nodata}
+        with WarpedVRT(
+            src, crs=WEB_MERCATOR, resampling=Resampling.bilinear,
+            transform=from_bounds(*tile_box, TILE_SIZE, TILE_SIZE),
+            width=TILE_SIZE, height=TILE_SIZE, **coverage
+        ) as vrt:
+            band_data = read_index_bands(vrt, expression)
+            # The added alpha band marks warped coverage; otherwise nodata does
+            mask = (vrt.read(vrt.count) if 'add_alpha' in coverage else vrt.dataset_mask()) > 0
+
+    if not mask.any():
+        return _transparent_tile()
+    index_data = expression.evaluate(band_data, np.empty((TILE_SIZE, TILE_SIZE), dtype=np.float32))
+    return encode_image(colorize(index_data, index_type, mask))
+
+def get_raster_tile(raster_path, index_type, bands, z, x, y):
+    """Return a PNG tile from the in-memory tile cache, rendering on a miss"""
+    tiles = _get_cache()
+    key = hashlib.sha1(
+        repr(file_key(raster_path) + (index_type, tuple(bands), z, x, y)).encode('utf-8')
+    ).hexdigest()
+    tile = tiles.get(key)
+    if tile is None:
+        tile = render_raster_tile(raster_path, index_type, bands, z, x, y)
+        tiles.put(key, tile)
+    return tile
+
+def cache_stats():
+    return _get_cache().stats()
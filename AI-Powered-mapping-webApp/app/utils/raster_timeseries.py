@@ -0,0 +1,323 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_app_context
+from app.utils.band_math import compile_index
+from app.utils.job_store import MemoryJobStore, SQLiteJobStore
+from app.utils.raster_processor import iter_windows
+
+SUMMARY_BANDS = ('delta', 'trend', 'max')
+# Columns of the timeseries_jobs table; progress holds the counters and output paths
+TIMESERIES_JOB_FIELDS = ('status', 'started_at', 'finished_at', 'progress', 'error')
+# Seconds between progress writes while a job runs
+PROGRESS_INTERVAL = 0.5
+
+# Open handles a pool worker keeps per process; the oldest are dropped beyond this
+MAX_OPEN_HANDLES = 32
+
+_store = None
+_store_lock = threading.Lock()
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+# Per-process handles, reused across the tasks a pool worker runs
+_open_rasters = {}
+_open_stacks = {}
+
+def _config(name, default):
+    """Read an app setting, falling back to ``default`` outside an application context"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def _band_source(scene, band):
+    """
+    (path, band index) holding ``band`` of a scene.
+
+    A scene is either one multi-band raster path or a list of single-band files, one
+    per band in order (like a VRT stacking separate band files).
+    """
+    if isinstance(scene, str):
+        return scene, band
+    if not 1 <= band <= len(scene):
+        raise ValueError(f"Band {band} is missing from a scene of {len(scene)} band files")
+    return scene[band - 1], 1
+
+def check_scenes(scenes, index_type, bands, window_size=1024):
+    """
+    Validate a batch: every scene must provide the index bands on the same pixel grid.
+
+    Returns the reference grid as (profile, windows) taken from the first scene.
+    """
+    if not scenes:
+        raise ValueError('No scenes given')
+    expression = compile_index(index_type, bands)
+    reference = None
+    for scene in scenes:
+        for band in expression.bands:
+            path, band_index = _band_source(scene, band)
+            with rasterio.open(path) as src:
+                if band_index > src.count:
+                    raise ValueError(f"{os.path.basename(path)} has no band {band_index}")
+                grid = (src.width, src.height, src.transform, src.crs)
+                if reference is None:
+                    reference = grid
+                    profile = src.profile.copy()
+                    windows = list(iter_windows(src, window_size))
+                elif grid != reference:
+                    raise ValueError(f"{os.path.basename(path)} is not on the same grid as the first scene")
+    return profile, windows
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = _config('TIMESERIES_JOB_DB', None)
+                if path:
+                    _store = SQLiteJobStore(
+                        path, 'timeseries_jobs', TIMESERIES_JOB_FIELDS, json_fields=('progress',)
+                    )
+                else:
+                    _store = MemoryJobStore()
+    return _store
+
+def _get_pool(workers):
+    """
+    The process-wide time-series pool, started on first use and shared by all jobs.
+
+    It is replaced when the worker count changes or after a worker died.
+    """
+    global _pool, _pool_key
+    key = (workers, os.getpid())
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None and _pool_key[1] == key[1]:
+                _pool.shutdown(wait=False)
+            # Spawned workers do not inherit the web server's threads or GDAL state
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_key = key
+        return _pool
+
+def _reset_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+def _cached_handle(cache, key, opener):
+    """Handle for ``key`` from a per-worker cache, closing the oldest beyond MAX_OPEN_HANDLES"""
+    handle = cache.get(key)
+    if handle is None:
+        handle = cache[key] = opener()
+        while len(cache) > MAX_OPEN_HANDLES:
+            oldest = cache.pop(next(iter(cache)))
+            if hasattr(oldest, 'close'):
+                oldest.close()
+    return handle
+
+def _scene_window_task(scene, index_type, bands, window, stack_path, t):
+    """Pool task: compute one window of one scene's index into the shared stack"""
+    expression = compile_index(index_type, bands)
+    window = Window(*window)
+    band_data = {}
+    for band in expression.bands:
+        path, band_index = _band_source(scene, band)
+        # Workers outlive jobs: a rewritten scene file gets a fresh handle
+        src = _cached_handle(_open_rasters, (path, os.stat(path).st_mtime_ns), lambda: rasterio.open(path))
+        band_data[band] = src.read(band_index, window=window, out_dtype='float32')
+
+    stack = _cached_handle(_open_stacks, stack_path, lambda: np.load(stack_path, mmap_mode='r+'))
+    rows, cols = window.toslices()
+    expression.evaluate(band_data, stack[t, rows, cols])
+    return int(window.width * window.height)
+
+def temporal_summary(series, times):
+    """
+    Per-pixel change statistics of a (time, rows, cols) stack, ignoring NaN.
+
+    Returns a (3, rows, cols) float32 array: last minus first acquisition, least-squares
+    slope per unit of ``times``, and the maximum.
+    """
+    times = np.asarray(times, dtype=np.float64)[:, None, None]
+    valid = np.isfinite(series)
+    values = np.where(valid, series, 0).astype(np.float64)
+    n = valid.sum(axis=0)
+    sum_t = (valid * times).sum(axis=0)
+    sum_tt = (valid * times * times).sum(axis=0)
+    sum_y = values.sum(axis=0)
+    sum_ty = (values * times).sum(axis=0)
+
+    summary = np.empty((3,) + series.shape[1:], dtype=np.float32)
+    summary[0] = series[-1] - series[0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denominator = n * sum_tt - sum_t * sum_t
+        summary[1] = np.where(denominator > 0, (n * sum_ty - sum_t * sum_y) / denominator, np.nan)
+    summary[2] = np.fmax.reduce(series, axis=0)
+    return summary
+
+def _summary_window_task(stack_path, times, window, chunk_rows=128):
+    """Pool task: temporal summary of one window of the stack, in row chunks to bound memory"""
+    stack = np.load(stack_path, mmap_mode='r')
+    col_off, row_off, width, height = window
+    summary = np.empty((len(SUMMARY_BANDS), height, width), dtype=np.float32)
+    for start in range(0, height, chunk_rows):
+        stop = min(start + chunk_rows, height)
+        series = np.asarray(stack[:, row_off + start:row_off + stop, col_off:col_off + width])
+        summary[:, start:stop] = temporal_summary(series, times)
+    return window, summary
+
+def run_timeseries(scenes, index_type, bands, output_dir, times=None, workers=None, window_size=None, progress=None):
+    """
+    Compute one index over many acquisitions of the same area.
+
+    Every (scene, window) pair is an independent task on a process pool; each worker
+    writes its window straight into a shared ``stack.npy`` memmap of shape
+    (scenes, rows, cols). A second round of per-window tasks reduces the stack to
+    delta, trend and max bands, written by this process to ``summary.tif`` as they
+    arrive, so neither output is ever held in memory whole.
+
+    Args:
+        scenes (list): Raster paths, or lists of single-band files, in acquisition order.
+        index_type (str): Built-in index name or custom band-math expression.
+        bands (list): Band numbers for the built-in index roles.
+        output_dir (str): Directory receiving ``stack.npy`` and ``summary.tif``.
+        times (list): Acquisition times used for the trend (default: 0, 1, 2, ...).
+        workers (int): Worker processes (default: the TIMESERIES_WORKERS setting).
+        window_size (int): Target window side in pixels (default: RASTER_WINDOW_SIZE).
+        progress (callable): Called with a dict of counters after every finished task.
+
+    Returns:
+        dict: Output paths.
+    """
+    if times is None:
+        times = list(range(len(scenes)))
+    if len(times) != len(scenes):
+        raise ValueError('Give one time per scene')
+    if workers is None:
+        workers = _config('TIMESERIES_WORKERS', 1)
+    if window_size is None:
+        window_size = _config('RASTER_WINDOW_SIZE', 1024)
+
+    profile, windows = check_scenes(scenes, index_type, bands, window_size)
+    os.makedirs(output_dir, exist_ok=True)
+    stack_path = os.path.join(output_dir, 'stack.npy')
+    summary_path = os.path.join(output_dir, 'summary.tif')
+    stack = np.lib.format.open_memmap(
+        stack_path, mode='w+', dtype=np.float32, shape=(len(scenes), profile['height'], profile['width'])
+    )
+    del stack  # Header written; workers map the file themselves
+
+    window_tuples = [(w.col_off, w.row_off, w.width, w.height) for w in windows]
+    counters = {
+        'phase': 'index',
+        'tasks_done': 0,
+        'tasks_total': len(scenes) * len(windows) + len(windows),
+        'pixels_done': 0,
+        'pixels_total': len(scenes) * profile['width'] * profile['height'],
+        'started_at': time.time()
+    }
+
+    def report(pixels=0):
+        counters['tasks_done'] += 1
+        counters['pixels_done'] += pixels
+        elapsed = time.time() - counters['started_at']
+        counters['elapsed_seconds'] = round(elapsed, 2)
+        counters['megapixels_per_second'] = round(counters['pixels_done'] / 1e6 / elapsed, 2) if elapsed else 0.0
+        if progress is not None:
+            progress(dict(counters))
+
+    profile.update(
+        driver='GTiff', count=len(SUMMARY_BANDS), dtype='float32', nodata=None,
+        tiled=True, blockxsize=512, blockysize=512, compress='deflate', bigtiff='IF_SAFER'
+    )
+    profile.pop('photometric', None)
+
+    pool = _get_pool(workers)
+    try:
+        futures = [
+            pool.submit(_scene_window_task, scene, index_type, bands, window, stack_path, t)
+            for t, scene in enumerate(scenes)
+            for window in window_tuples
+        ]
+        for future in as_completed(futures):
+            report(future.result())
+
+        counters['phase'] = 'summary'
+        with rasterio.open(summary_path, 'w', **profile) as dst:
+            dst.descriptions = SUMMARY_BANDS
+            futures = [pool.submit(_summary_window_task, stack_path, times, window) for window in window_tuples]
+            for future in as_completed(futures):
+                window, summary = future.result()
+                dst.write(summary, window=Window(*window))
+                report()
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); the next job starts a fresh pool
+        _reset_pool(pool)
+        raise
+
+    counters['phase'] = 'done'
+    if progress is not None:
+        progress(dict(counters))
+    return {'stack_path': stack_path, 'summary_path': summary_path}
+
+def start_timeseries_job(scenes, index_type, bands, output_root, times=None):
+    """
+    Validate a batch, then run ``run_timeseries`` on a background thread.
+
+    Returns a job id whose progress ``job_status`` reports. Job records live in
+    TIMESERIES_JOB_DB when set, so every web worker can report them, and are dropped
+    TIMESERIES_JOB_TTL seconds after the job finished.
+    """
+    # Settings are read here: the background thread has no application context
+    workers = _config('TIMESERIES_WORKERS', 1)
+    window_size = _config('RASTER_WINDOW_SIZE', 1024)
+    check_scenes(scenes, index_type, bands, window_size)
+    if times is not None and len(times) != len(scenes):
+        raise ValueError('Give one time per scene')
+
+    store = _get_store()
+    store.prune(time.time() - _config('TIMESERIES_JOB_TTL', 86400))
+    job_id = uuid.uuid4().hex
+    store.create(job_id, status='running', started_at=time.time(), progress={'phase': 'validating'})
+    latest = {'counters': {'phase': 'validating'}, 'written_at': 0.0}
+
+    def update(counters):
+        previous, latest['counters'] = latest['counters'], counters
+        now = time.time()
+        # Progress is written at most every PROGRESS_INTERVAL, and whenever the phase changes
+        if now - latest['written_at'] >= PROGRESS_INTERVAL or counters['phase'] != previous['phase']:
+            latest['written_at'] = now
+            store.update(job_id, progress=counters)
+
+    def run():
+        try:
+            outputs = run_timeseries(
+                scenes, index_type, bands, os.path.join(output_root, job_id),
+                times=times, workers=workers, window_size=window_size, progress=update
+            )
+            store.update(job_id, status='done', finished_at=time.time(), progress=dict(latest['counters'], **outputs))
+        except Exception as e:
+            store.update(job_id, status='failed', finished_at=time.time(), error=str(e))
+
+    threading.Thread(target=run, daemon=True).start()
+    return job_id
+
+def job_status(job_id):
+    """Progress counters of a job with its status ('running', 'done' or 'failed') and any error"""
+    job = _get_store().get(job_id)
+    if job is None:
+        return None
+    status = dict(job.get('progress') or {}, status=job['status'])
+    if job.get('error') is not None:
+        status['error'] = job['error']
+    return status
@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from flask import current_app, has_app_context
+from app.utils.lru_cache import LRUCache, prune_directory
+
+_cache = None
+_cache_lock = threading.Lock()
+_disk_stats = {'hits': 0, 'writes': 0, 'evictions': 0}
+
+def _response_size(response):
+    return sum(len(value) for value in response.values())
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                max_bytes = current_app.config['RENDER_CACHE_MAX_BYTES'] if has_app_context() else 64 * 1024 * 1024
+                _cache = LRUCache(max_bytes, sizeof=_response_size)
+    return _cache
+
+def _disk_dir():
+    if not has_app_context():
+        return None
+    return current_app.config.get('RENDER_CACHE_DIR')
+
+def render_key(fingerprint, mode, column, styles=None, titles=None):
+    """
+    Hash everything that determines a rendered map.
+
+    Args:
+        fingerprint (str): Content hash of the (filtered, projected) dataset.
+        mode (str): 'static', 'interactive' or 'heatmap'.
+        column (str): Mapped column.
+        styles (dict): Normalized style options; only passed for renderers that use them.
+        titles (dict): Title strings extracted from the user message.
+    """
+    payload = json.dumps(
+        [fingerprint, mode, column, styles or {}, titles or {}],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def get_render(key):
+    """Return a cached map response dict, checking memory first and then the disk tier"""
+    cache = _get_cache()
+    response = cache.get(key)
+    if response is not None:
+        return response
+
+    directory = _disk_dir()
+    if not directory:
+        return None
+    path = os.path.join(directory, f"{key}.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            response = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    os.utime(path)  # Mark as recently used for disk eviction
+    _disk_stats['hits'] += 1
+    cache.put(key, response)
+    return response
+
+def put_render(key, response):
+    """Store a map response dict in memory and, when configured, on disk"""
+    _get_cache().put(key, response)
+
+    directory = _disk_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so concurrent readers never see a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(response, f)
+    os.replace(tmp_path, os.path.join(directory, f"{key}.json"))
+    _disk_stats['writes'] += 1
+    _disk_stats['evictions'] += prune_directory(
+        directory, current_app.config['RENDER_CACHE_DISK_MAX_BYTES'], suffix='.json'
+    )
+
+def cache_stats():
+    stats = _get_cache().stats()
+    stats['disk'] = dict(_disk_stats, enabled=bool(_disk_dir()))
+    return stats
+
+def clear_cache():
+    _get_cache().clear()
@@ -0,0 +1,240 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import Flask, current_app, has_app_context
+from app.utils.job_store import MemoryJobStore, SQLiteJobStore
+
+# Columns of the render_jobs table
+RENDER_JOB_FIELDS = ('owner', 'status', 'enqueued_at', 'started_at', 'finished_at', 'result', 'error')
+
+# Config values handed to worker processes; anything else (callables, objects) stays behind
+_PLAIN_TYPES = (str, int, float, bool, type(None), tuple, list, dict, set)
+
+_pool = None
+_pool_pid = None
+_pool_events = None
+_pool_lock = threading.Lock()
+_store = None
+_futures = {}
+_queued = set()
+_running = set()
+_metrics = {'submitted': 0, 'completed': 0, 'failed': 0}
+_timings = deque(maxlen=200)  # (wait seconds, runtime seconds) of recent jobs
+_metrics_lock = threading.Lock()
+
+# Set in each worker process by _init_worker
+_worker_events = None
+
+def _config(name, default):
+    """Read an app setting, falling back to ``default`` outside an application context"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _pool_lock:
+            if _store is None:
+                path = _config('RENDER_JOB_DB', None)
+                if path:
+                    _store = SQLiteJobStore(path, 'render_jobs', RENDER_JOB_FIELDS, json_fields=('result',))
+                else:
+                    _store = MemoryJobStore()
+    return _store
+
+def _init_worker(config, events):
+    """
+    Pool initializer: import the rendering stack once and keep an app context open, so
+    settings read through current_app behave as in the web process.
+    """
+    global _worker_events
+    _worker_events = events
+    import matplotlib
+    matplotlib.use('Agg')
+    import app.utils.map_generator  # noqa: F401  geopandas, matplotlib, folium, mapclassify
+    worker_app = Flask('render_worker')
+    worker_app.config.update(config)
+    worker_app.app_context().push()
+
+def _ping():
+    return os.getpid()
+
+def _render_task(job_id, dataset_path, column_names, needed_columns, where, bbox, styles, user_message):
+    """Pool task: load the requested view of a dataset and render its map"""
+    from app.utils.dataset_cache import load_dataset
+    from app.utils.map_generator import generate_map_response
+    started_at = time.time()
+    _worker_events.put((job_id, started_at))
+    gdf = load_dataset(dataset_path, columns=needed_columns, where=where, bbox=bbox)
+    response = generate_map_response(gdf, column_names, styles, user_message)
+    return started_at, time.time(), response
+
+def _listen(events):
+    """Parent thread: mark jobs as running when a worker picks them up, until sent None"""
+    while True:
+        event = events.get()
+        if event is None:
+            return
+        job_id, started_at = event
+        with _metrics_lock:
+            if job_id not in _queued:
+                continue  # Already finished
+            _queued.discard(job_id)
+            _running.add(job_id)
+            # Under the lock, so a concurrent _finish cannot be overwritten
+            _get_store().update(job_id, status='running', started_at=started_at)
+
+def get_pool():
+    """
+    The process-wide render pool, started on first use with RENDER_WORKERS processes.
+
+    Every worker is started and warmed (rendering libraries imported) right away, so
+    the first jobs do not pay for process start-up.
+    """
+    global _pool, _pool_pid, _pool_events
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                workers = _config('RENDER_WORKERS', 2)
+                config = {
+                    key: value for key, value in current_app.config.items()
+                    if key.isupper() and isinstance(value, _PLAIN_TYPES)
+                }
+                # Spawned workers do not inherit the web server's threads, sockets or GDAL state
+                context = multiprocessing.get_context('spawn')
+                events = context.Queue()
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=context,
+                    initializer=_init_worker, initargs=(config, events)
+                )
+                _pool_pid = os.getpid()
+                _pool_events = events
+                threading.Thread(target=_listen, args=(events,), daemon=True).start()
+                for _ in range(workers):
+                    _pool.submit(_ping)
+    return _pool
+
+def _reset_pool(pool):
+    """Drop a broken pool: shut it down and stop its listener, unless already replaced"""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+        events = _pool_events
+    pool.shutdown(wait=False)
+    events.put(None)
+
+def _finish(job_id, enqueued_at, future):
+    """Done-callback: store the outcome and record wait and run times"""
+    with _metrics_lock:
+        _queued.discard(job_id)
+        _running.discard(job_id)
+    try:
+        started_at, finished_at, response = future.result()
+    except Exception as e:
+        with _metrics_lock:
+            _metrics['failed'] += 1
+        _get_store().update(job_id, status='failed', finished_at=time.time(), error=str(e))
+        return
+    with _metrics_lock:
+        _metrics['completed'] += 1
+        _timings.append((started_at - enqueued_at, finished_at - started_at))
+    _get_store().update(job_id, status='done', started_at=started_at, finished_at=finished_at, result=response)
+
+def submit_render(dataset_path, column_names, needed_columns, where, bbox, styles, user_message, owner=None):
+    """
+    Queue a map render on the worker pool and return its job id.
+
+    The worker loads ``needed_columns`` of the dataset with the given filters and calls
+    ``generate_map_response``; poll ``job_status`` or block on ``wait_for_render``.
+    ``owner`` (a user id, stored as text) is kept with the job so others can be refused.
+    """
+    store = _get_store()
+    store.prune(time.time() - _config('RENDER_JOB_TTL', 3600))
+    job_id = uuid.uuid4().hex
+    enqueued_at = time.time()
+    store.create(job_id, owner=None if owner is None else str(owner), status='queued', enqueued_at=enqueued_at)
+    args = (job_id, dataset_path, column_names, needed_columns, where, bbox, styles, user_message)
+    # Registered before submitting: a worker may report the start before submit() returns
+    with _metrics_lock:
+        _metrics['submitted'] += 1
+        _queued.add(job_id)
+    try:
+        pool = get_pool()
+        try:
+            future = pool.submit(_render_task, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool once
+            _reset_pool(pool)
+            future = get_pool().submit(_render_task, *args)
+    except Exception as e:
+        with _metrics_lock:
+            _queued.discard(job_id)
+            _metrics['failed'] += 1
+        store.update(job_id, status='failed', finished_at=time.time(), error=str(e))
+        raise
+
+    with _metrics_lock:
+        _futures[job_id] = future
+        if len(_futures) > 1000:
+            # Finished jobs nobody waited for or polled
+            for stale_id in [j for j, f in _futures.items() if f.done()]:
+                del _futures[stale_id]
+    future.add_done_callback(lambda f: _finish(job_id, enqueued_at, f))
+    return job_id
+
+def wait_for_render(job_id, timeout=None):
+    """
+    Block until a job finishes and return its map response.
+
+    Jobs of this process are awaited directly; others are polled from the job store.
+    Render errors are raised again here.
+    """
+    if timeout is None:
+        timeout = _config('RENDER_JOB_TIMEOUT', 300)
+    with _metrics_lock:
+        future = _futures.pop(job_id, None)
+    if future is not None:
+        return future.result(timeout=timeout)[2]
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = job_status(job_id)
+        if job is None:
+            raise KeyError(f"Unknown render job {job_id}")
+        if job['status'] == 'done':
+            return job['result']
+        if job['status'] == 'failed':
+            raise RuntimeError(job['error'])
+        time.sleep(0.1)
+    raise TimeoutError(f"Render job {job_id} did not finish within {timeout}s")
+
+def job_status(job_id):
+    """Job record: owner, status ('queued', 'running', 'done' or 'failed'), timestamps, result or error"""
+    job = _get_store().get(job_id)
+    if job is not None and job['status'] in ('done', 'failed'):
+        with _metrics_lock:
+            _futures.pop(job_id, None)  # Polled to completion, nobody will wait on it
+    return job
+
+def job_stats():
+    """Queue depth, job counts and wait/run times (seconds) of recent jobs in this process"""
+    with _metrics_lock:
+        stats = dict(_metrics, queue_depth=len(_queued), running=len(_running))
+        timings = list(_timings)
+    stats['workers'] = _config('RENDER_WORKERS', 2)
+    stats['backend'] = 'sqlite' if _config('RENDER_JOB_DB', None) else 'memory'
+    if timings:
+        waits, runtimes = zip(*timings)
+        stats['mean_wait_seconds'] = round(sum(waits) / len(waits), 3)
+        stats['max_wait_seconds'] = round(max(waits), 3)
+        stats['mean_runtime_seconds'] = round(sum(runtimes) / len(runtimes), 3)
+        stats['max_runtime_seconds'] = round(max(runtimes), 3)
+    return stats
@@ -0,0 +1,165 @@
+import os
+import math
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+import shapely
+import mapbox_vector_tile
+from flask import current_app
+import branca.colormap as cm
+from urllib.parse import quote
+from app.utils.lru_cache import LRUCache, prune_directory
+from app.utils.dataset_cache import dataset_key, estimate_gdf_bytes
+from app.utils.file_processor import read_dataset
+
+# Name of the single layer inside every tile; the interactive map styles this layer
+TILE_LAYER = 'features'
+TILE_EXTENT = 4096
+TILE_BUFFER = 64  # Extent units drawn outside the tile so strokes do not seam at edges
+WEB_MERCATOR_HALF_WORLD = 20037508.342789244
+MAX_ZOOM = 22
+
+_sources = None
+_tiles = None
+_caches_lock = threading.Lock()
+_disk_stats = {'hits': 0, 'writes': 0, 'evictions': 0}
+
+def _get_caches():
+    global _sources, _tiles
+    if _tiles is None:
+        with _caches_lock:
+            if _tiles is None:
+                _sources = LRUCache(current_app.config['VECTOR_TILE_SOURCE_MAX_BYTES'], sizeof=estimate_gdf_bytes)
+                _tiles = LRUCache(current_app.config['VECTOR_TILE_CACHE_MAX_BYTES'])
+    return _sources, _tiles
+
+def tile_bounds(z, x, y):
+    """Web Mercator bounds (minx, miny, maxx, maxy) of an XYZ tile"""
+    size = 2 * WEB_MERCATOR_HALF_WORLD / 2 ** z
+    minx = -WEB_MERCATOR_HALF_WORLD + x * size
+    maxy = WEB_MERCATOR_HALF_WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+def tile_url_template(dataset, columns):
+    """Leaflet URL template for the tile endpoint serving ``columns`` of a dataset"""
+    return f"/tiles/{quote(dataset)}/{{z}}/{{x}}/{{y}}.pbf?columns={quote(','.join(columns))}"
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+def _tile_source(path, columns):
+    """Web Mercator copy of a dataset with its spatial index, built once and cached"""
+    sources, _ = _get_caches()
+    key = dataset_key(path) + (tuple(columns),)
+    source = sources.get(key)
+    if source is None:
+        source = read_dataset(path, columns=columns).to_crs(epsg=3857)
+        source.sindex  # Build the STRtree now so it is cached with the frame
+        sources.put(key, source)
+    return source
+
+def _properties(record):
+    """Tile properties must be plain scalars; missing values are left out"""
+    properties = {}
+    for name, value in record.items():
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            continue
+        if isinstance(value, (bool, int, float, str)):
+            properties[name] = value
+        else:
+            properties[name] = str(value)
+    return properties
+
+def render_tile(path, z, x, y, columns):
+    """
+    Encode one Mapbox Vector Tile for a dataset.
+
+    Features are selected through the spatial index, clipped to the buffered tile and
+    simplified to one tile extent unit, so the work per tile depends on what is visible
+    rather than on the dataset size.
+    """
+    source = _tile_source(path, columns)
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    buffer = (maxx - minx) * TILE_BUFFER / TILE_EXTENT
+    clip_box = (minx - buffer, miny - buffer, maxx + buffer, maxy + buffer)
+
+    rows = source.sindex.query(shapely.box(*clip_box), predicate='intersects')
+    if len(rows) == 0:
+        return b''
+
+    geoms = np.asarray(source.geometry.values)[rows]
+    geoms = shapely.clip_by_rect(geoms, *clip_box)
+    geoms = shapely.simplify(geoms, (maxx - minx) / TILE_EXTENT, preserve_topology=True)
+    keep = ~shapely.is_empty(geoms)
+
+    records = source.iloc[rows[keep]][list(columns)].to_dict('records')
+    features = [
+        {'geometry': geom, 'properties': _properties(record)}
+        for geom, record in zip(geoms[keep], records)
+    ]
+    if not features:
+        return b''
+
+    return mapbox_vector_tile.encode(
+        [{'name': TILE_LAYER, 'features': features}],
+        default_options={'quantize_bounds': (minx, miny, maxx, maxy), 'extents': TILE_EXTENT}
+    )
+
+def get_tile(path, z, x, y, columns):
+    """Return tile bytes from the memory or disk tile cache, rendering on a miss"""
+    _, tiles = _get_caches()
+    key = hashlib.sha1(repr(dataset_key(path) + (tuple(columns), z, x, y)).encode('utf-8')).hexdigest()
+    tile = tiles.get(key)
+    if tile is not None:
+        return tile
+
+    directory = current_app.config.get('VECTOR_TILE_CACHE_DIR')
+    disk_path = os.path.join(directory, f"{key}.pbf") if directory else None
+    if disk_path and os.path.exists(disk_path):
+        with open(disk_path, 'rb') as f:
+            tile = f.read()
+        os.utime(disk_path)
+        _disk_stats['hits'] += 1
+    else:
+        tile = render_tile(path, z, x, y, columns)
+        if disk_path:
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(tile)
+            os.replace(tmp_path, disk_path)
+            _disk_stats['writes'] += 1
+            _disk_stats['evictions'] += prune_directory(
+                directory, current_app.config['VECTOR_TILE_DISK_MAX_BYTES'], suffix='.pbf'
+            )
+
+    tiles.put(key, tile)
+    return tile
+
+def color_classes(values, is_categorical, scheme='YlGn', bins=7):
+    """
+    Client-side styling rules for a tiled layer.
+
+    Returns a dict with either 'categories' (value -> color) or 'thresholds' and
+    'colors' (upper class bounds and their colors), mirroring the embedded choropleth.
+    """
+    if is_categorical:
+        unique_values = pd.unique(values.dropna())
+        color_map = cm.linear.Set3_12.scale(0, max(len(unique_values) - 1, 1))
+        return {'categories': {str(val): color_map(i) for i, val in enumerate(unique_values)}}
+
+    numeric = pd.to_numeric(values, errors='coerce').dropna()
+    thresholds = np.unique(np.quantile(numeric, np.linspace(0, 1, bins + 1)[1:])) if len(numeric) else np.array([0.0])
+    color_map = getattr(cm.linear, f"{scheme}_09").scale(0, max(len(thresholds) - 1, 1))
+    return {
+        'thresholds': [float(t) for t in thresholds],
+        'colors': [color_map(i) for i in range(len(thresholds))]
+    }
+
+def cache_stats():
+    sources, tiles = _get_caches()
+    stats = tiles.stats()
+    stats['sources'] = sources.stats()
+    stats['disk'] = dict(_disk_stats, enabled=bool(current_app.config.get('VECTOR_TILE_CACHE_DIR')))
+    return stats
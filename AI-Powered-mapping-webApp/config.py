@@ -1,17 +1,67 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Config:
-    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-123')
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///site.db')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-    UPLOAD_FOLDER = 'uploads'
-    ALLOWED_EXTENSIONS = {'geojson', 'json', 'shp', 'shx', 'dbf', 'prj', 'tif', 'tiff'}
-    GENAI_API_KEY = os.getenv('GENAI_API_KEY')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
-
-    @staticmethod
-    def init_app(app):
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-123')
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///site.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    UPLOAD_FOLDER = 'uploads'
+    ALLOWED_EXTENSIONS = {'geojson', 'json', 'shp', 'shx', 'dbf', 'prj', 'tif', 'tiff'}
+    GENAI_API_KEY = os.getenv('GENAI_API_KEY')
+    GENAI_MODEL = os.getenv('GENAI_MODEL', 'gemini-1.5-flash')
+    GENAI_API_ENDPOINT = os.getenv('GENAI_API_ENDPOINT')  # e.g. http://127.0.0.1:8089 for a local stub
+    GENAI_TRANSPORT = os.getenv('GENAI_TRANSPORT', 'rest')
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 30))  # Seconds per model call across all attempts, including time queued
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))  # Extra attempts on transient errors
+    LLM_RETRY_BACKOFF = 0.5  # Seconds before the first retry; doubles with each attempt
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))  # Model calls in flight per process
+    PROMPT_MAX_COLUMNS = int(os.getenv('PROMPT_MAX_COLUMNS', 40))  # Wider schemas are shortlisted in model prompts
+    PROMPT_TOP_COLUMNS = int(os.getenv('PROMPT_TOP_COLUMNS', 20))  # Columns most relevant to the message sent for wide schemas
+    PROFILE_HISTOGRAM_BINS = int(os.getenv('PROFILE_HISTOGRAM_BINS', 10))  # Histogram bins per numeric column in upload profiles
+    PROFILE_TOP_CATEGORIES = int(os.getenv('PROFILE_TOP_CATEGORIES', 10))  # Most frequent values kept per non-numeric column
+    INTENT_LOCAL_PARSER = os.getenv('INTENT_LOCAL_PARSER', 'true').lower() == 'true'  # Resolve map/stats requests naming a column without the model
+    INTENT_LOCAL_MIN_CONFIDENCE = 0.85  # Fuzzy column-match score needed to skip the model
+    INTENT_CACHE_PATH = os.getenv('INTENT_CACHE_PATH', os.path.join('uploads', 'intent_cache.sqlite'))  # Parsed model answers shared by all workers
+    INTENT_CACHE_TTL = int(os.getenv('INTENT_CACHE_TTL', 24 * 3600))  # Seconds a cached answer stays valid
+    INTENT_CACHE_MAX_ENTRIES = int(os.getenv('INTENT_CACHE_MAX_ENTRIES', 10000))
+    INTENT_CACHE_MEMORY_ENTRIES = 1024  # Most recent answers also kept in each process
+    WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', 'true').lower() == 'true'  # Import heavy modules in the background after start-up
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
+    HEATMAP_AGGREGATE_THRESHOLD = int(os.getenv('HEATMAP_AGGREGATE_THRESHOLD', 50000))  # Points above which heatmaps are binned server-side
+    HEATMAP_CELL_PX = 8  # Aggregation cell size in screen pixels at the fitted zoom
+    HEATMAP_MAX_CELLS = 256  # Upper bound on aggregation cells per axis
+    DATASET_CACHE_MAX_BYTES = int(os.getenv('DATASET_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # Parsed GeoDataFrames kept in memory
+    LOD_LEVELS = 8  # Simplification pyramid levels per dataset, each doubling the tolerance
+    LOD_ZOOM_HEADROOM = 2  # Zoom levels past the initial view that interactive maps stay sub-pixel
+    LOD_CACHE_MAX_BYTES = int(os.getenv('LOD_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    VECTOR_TILE_COORDINATE_THRESHOLD = int(os.getenv('VECTOR_TILE_COORDINATE_THRESHOLD', 500000))  # Interactive maps switch to vector tiles above this many vertices
+    VECTOR_TILE_SOURCE_MAX_BYTES = int(os.getenv('VECTOR_TILE_SOURCE_MAX_BYTES', 512 * 1024 * 1024))  # Reprojected, indexed layers kept for tiling
+    VECTOR_TILE_CACHE_MAX_BYTES = int(os.getenv('VECTOR_TILE_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+    VECTOR_TILE_CACHE_DIR = os.getenv('VECTOR_TILE_CACHE_DIR')  # Optional on-disk tile cache
+    VECTOR_TILE_DISK_MAX_BYTES = int(os.getenv('VECTOR_TILE_DISK_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+    RASTER_WINDOW_SIZE = 1024  # Target window side (pixels) for block-wise raster processing
+    RASTER_WORKERS = int(os.getenv('RASTER_WORKERS', os.cpu_count() or 1))  # Threads used for window-parallel raster math
+    RASTER_IN_MEMORY_MAX_PIXELS = int(os.getenv('RASTER_IN_MEMORY_MAX_PIXELS', 64 * 1024 * 1024))  # Larger index results go to a scratch memmap
+    RASTER_PREVIEW_MAX_SIZE = 1000  # Longer side (pixels) of index previews, read from overviews
+    RASTER_PREVIEW_FORMAT = os.getenv('RASTER_PREVIEW_FORMAT', 'png')  # 'png' or 'webp'
+    INDEX_CACHE_DIR = os.getenv('INDEX_CACHE_DIR', os.path.join('uploads', 'index_cache'))  # Computed index arrays, reopened as memmaps
+    INDEX_CACHE_MAX_BYTES = int(os.getenv('INDEX_CACHE_MAX_BYTES', 4 * 1024 * 1024 * 1024))  # Disk budget for cached index arrays
+    RASTER_TILE_CACHE_MAX_BYTES = int(os.getenv('RASTER_TILE_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # Rendered index PNG tiles kept in memory
+    ZONAL_HISTOGRAM_BINS = 256  # Per-zone histogram bins used to interpolate zonal percentiles
+    TIMESERIES_WORKERS = int(os.getenv('TIMESERIES_WORKERS', os.cpu_count() or 1))  # Processes used for batch time-series jobs
+    TIMESERIES_JOB_DB = os.getenv('TIMESERIES_JOB_DB', os.path.join('uploads', 'timeseries_jobs.sqlite'))  # Shared job records; empty keeps them in memory
+    TIMESERIES_JOB_TTL = 86400  # Seconds finished time-series job records are kept
+    RASTER_SCRATCH_DIR = os.getenv('RASTER_SCRATCH_DIR')  # Defaults to the system temp directory
+    RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))  # Map render worker processes; 0 renders inside the request
+    RENDER_JOB_DB = os.getenv('RENDER_JOB_DB', os.path.join('uploads', 'render_jobs.sqlite'))  # Shared job records; empty keeps them in memory
+    RENDER_JOB_TIMEOUT = int(os.getenv('RENDER_JOB_TIMEOUT', 300))  # Seconds a request waits for its map
+    RENDER_JOB_TTL = 3600  # Seconds finished job records are kept
+    RENDER_CACHE_MAX_BYTES = int(os.getenv('RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # Rendered map PNG/HTML kept in memory
+    RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR')  # Optional on-disk tier for rendered maps
+    RENDER_CACHE_DISK_MAX_BYTES = int(os.getenv('RENDER_CACHE_DISK_MAX_BYTES', 1024 * 1024 * 1024))
+
+    @staticmethod
+    def init_app(app):
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
\ No newline at end of file
@@ -1,6 +1,9 @@
-from app import create_app
-
-app = create_app()
-
-if __name__ == '__main__':
+import multiprocessing
+from app import create_app
+
+# Spawned pool workers re-import this module as __mp_main__; only server processes build the app
+if multiprocessing.parent_process() is None:
+    app = create_app()
+
+if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
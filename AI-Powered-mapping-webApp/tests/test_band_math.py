@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from app.utils import band_math
+
+
+def _bands(seed=0, shape=(4, 5)):
+    rng = np.random.default_rng(seed)
+    return {band: rng.uniform(0.01, 1.0, shape).astype(np.float32) for band in (1, 2, 3, 4)}
+
+
+def _evaluate(compiled, band_data):
+    out = np.empty(next(iter(band_data.values())).shape, dtype=np.float32)
+    return compiled.evaluate(band_data, out)
+
+
+@pytest.mark.parametrize('expression', [
+    '__import__("os").system("true")',
+    'b1.real',
+    'np.sqrt(b1)',
+    'open("x")',
+    'max(b1, b2)',
+    'sqrt(b1, b2)',
+    'b1 if b2 else b3',
+    'b1 < b2',
+    '[b1, b2]',
+    'lambda: b1',
+])
+def test_rejects_calls_and_attributes(expression):
+    with pytest.raises(ValueError):
+        band_math.compile_index(expression, [])
+
+
+def test_rejects_unknown_variables():
+    with pytest.raises(ValueError):
+        band_math.compile_index('nir - b0', [])
+    with pytest.raises(ValueError):
+        band_math.compile_index('NDVI', [4])
+
+
+def test_ndvi_matches_numpy():
+    data = _bands()
+    nir, red = data[4].astype(np.float64), data[3].astype(np.float64)
+    compiled = band_math.compile_index('NDVI', [4, 3])
+    assert compiled.bands == [3, 4]
+    np.testing.assert_allclose(_evaluate(compiled, data), (nir - red) / (nir + red), rtol=1e-5)
+
+
+def test_custom_expression_matches_numpy():
+    data = _bands(seed=1)
+    b1, b2, b3 = (data[band].astype(np.float64) for band in (1, 2, 3))
+    expected = -(b1 - 2 * b2) / np.sqrt(b3 + 1) + abs(b2 - b1) ** 2 + 2 ** 3
+    compiled = band_math.compile_index('-(b1 - 2 * b2) / sqrt(b3 + 1) + abs(b2 - b1) ** 2 + 2 ** 3', [])
+    assert compiled.bands == [1, 2, 3]
+    np.testing.assert_allclose(_evaluate(compiled, data), expected, rtol=1e-5)
+
+
+def test_bare_band_and_division_by_zero():
+    data = {1: np.array([1.0, 0.0, -2.0], dtype=np.float32), 2: np.zeros(3, dtype=np.float32)}
+    np.testing.assert_array_equal(_evaluate(band_math.compile_index('b1', []), data), data[1])
+    result = _evaluate(band_math.compile_index('b1 / b2', []), data)
+    assert np.isinf(result[0]) and np.isnan(result[1]) and np.isinf(result[2])
+
+
+def test_compiled_once_per_definition():
+    assert band_math.compile_index('NDVI', [4, 3]) is band_math.compile_index('NDVI', [4, 3])
+    assert band_math.compile_index('NDVI', [4, 3]) is not band_math.compile_index('NDVI', [3, 4])
@@ -0,0 +1,70 @@
+import pytest
+from flask import Flask
+from app.utils import intent_parser
+from app.utils.intent_parser import parse_intent
+
+COLUMNS = ['NAME', 'PROVINCE', 'POPULATION', 'PRECIPITAT']
+PROFILE = {'columns': {
+    'NAME': {'dtype': 'object'},
+    'PROVINCE': {'dtype': 'object'},
+    'POPULATION': {'dtype': 'int64', 'numeric': True},
+    'PRECIPITAT': {'dtype': 'float64', 'numeric': True},
+}}
+
+
+@pytest.fixture
+def min_confidence():
+    """Runs parse_intent under an app whose INTENT_LOCAL_MIN_CONFIDENCE the test sets"""
+    app = Flask(__name__)
+    with app.app_context():
+        def configure(value):
+            app.config['INTENT_LOCAL_MIN_CONFIDENCE'] = value
+        yield configure
+
+
+def test_named_column_is_resolved():
+    assert parse_intent("Create an interactive map of population", COLUMNS) == (
+        "🗺️ Here's an interactive map of POPULATION.", ['POPULATION']
+    )
+    assert parse_intent("statistics for POPULATION and PRECIPITAT", COLUMNS) == (
+        "📊 Here are the statistics for POPULATION, PRECIPITAT.", ['POPULATION', 'PRECIPITAT']
+    )
+
+
+def test_questions_and_other_requests_are_deferred():
+    assert parse_intent("What does the POPULATION map show?", COLUMNS) is None
+    assert parse_intent("Tell me about POPULATION", COLUMNS) is None
+    assert parse_intent("map POPULATION", []) is None
+
+
+def test_filter_columns_are_not_mapped():
+    assert parse_intent("map POPULATION where PROVINCE = Punjab", COLUMNS)[1] == ['POPULATION']
+
+
+def test_confidence_threshold(min_confidence):
+    # "precipitation" against PRECIPITAT scores 20/23, about 0.87
+    min_confidence(0.85)
+    assert parse_intent("map precipitation", COLUMNS)[1] == ['PRECIPITAT']
+    min_confidence(0.9)
+    assert parse_intent("map precipitation", COLUMNS) is None
+
+
+def test_tie_needs_a_single_numeric_column():
+    message = "map NAME and POPULATION"
+    assert parse_intent(message, COLUMNS) is None
+    assert parse_intent(message, COLUMNS, PROFILE) == ("🗺️ Here's a map of POPULATION.", ['POPULATION'])
+    # Two numeric candidates are still ambiguous
+    assert parse_intent("map POPULATION and PRECIPITAT", COLUMNS, PROFILE) is None
+    # No numeric candidate at all
+    assert parse_intent("map NAME and PROVINCE", COLUMNS, PROFILE) is None
+    # Statistics take every matched column, so there is nothing to break
+    assert parse_intent("stats for NAME and POPULATION", COLUMNS, PROFILE)[1] == ['NAME', 'POPULATION']
+
+
+def test_stats_count_resolved_and_deferred():
+    before = intent_parser.parser_stats()
+    parse_intent("map POPULATION", COLUMNS)
+    parse_intent("map something else", COLUMNS)
+    after = intent_parser.parser_stats()
+    assert after['resolved'] == before['resolved'] + 1
+    assert after['deferred'] == before['deferred'] + 1
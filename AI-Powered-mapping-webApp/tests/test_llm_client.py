@@ -0,0 +1,82 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from flask import Flask
+from app.utils import llm_client
+
+ANSWER = 'TYPE: GENERAL\nRESPONSE: NDVI measures vegetation.'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers generateContent like the Gemini REST API, as scripted by ``server.script``"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.hits += 1
+        action = self.server.script.pop(0) if self.server.script else 'ok'
+        if action == 'hang':
+            time.sleep(3)
+            return
+        if action == 503:
+            status, body = 503, {'error': {'code': 503, 'message': 'overloaded', 'status': 'UNAVAILABLE'}}
+        else:
+            status, body = 200, {'candidates': [
+                {'content': {'role': 'model', 'parts': [{'text': ANSWER}]}, 'finishReason': 'STOP', 'index': 0}
+            ]}
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(body).encode('utf-8'))
+        except OSError:
+            pass  # The client gave up
+
+
+@pytest.fixture(scope='module')
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def app_context(stub):
+    stub.hits, stub.script = 0, []
+    app = Flask(__name__)
+    app.config.update(
+        GENAI_API_ENDPOINT=f"http://127.0.0.1:{stub.server_port}",
+        LLM_TIMEOUT=1.0, LLM_MAX_RETRIES=1, LLM_RETRY_BACKOFF=0.05
+    )
+    with app.app_context():
+        yield stub
+
+def test_returns_the_model_text(app_context):
+    assert llm_client.generate_text('What is NDVI?', 'key') == ANSWER
+    assert app_context.hits == 1
+
+def test_retries_a_503(app_context):
+    app_context.script = [503]
+    retries = llm_client.llm_stats()['retries']
+    assert llm_client.generate_text('What is NDVI?', 'key') == ANSWER
+    assert app_context.hits == 2
+    assert llm_client.llm_stats()['retries'] == retries + 1
+
+def test_timeout_is_one_deadline_and_not_retried(app_context):
+    app_context.script = ['hang', 'hang']
+    started = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        llm_client.generate_text('What is NDVI?', 'key')
+    assert time.perf_counter() - started < 1.5
+    assert app_context.hits == 1
+    # The abandoned attempt had the same deadline, so its slot frees up right away
+    for _ in range(20):
+        if llm_client.llm_stats()['in_flight'] == 0:
+            break
+        time.sleep(0.05)
+    assert llm_client.llm_stats()['in_flight'] == 0
@@ -0,0 +1,67 @@
+import os
+from app.utils.lru_cache import LRUCache, prune_directory
+
+
+def test_evicts_least_recently_used_to_fit_budget():
+    cache = LRUCache(10)
+    cache.put('a', b'xxx')
+    cache.put('b', b'xxx')
+    cache.put('c', b'xxx')
+    assert cache.get('a') == b'xxx'  # 'b' is now the least recently used
+
+    cache.put('d', b'xx')  # 11 bytes: one eviction
+    assert 'b' not in cache
+    assert [key for key in 'abcd' if key in cache] == ['a', 'c', 'd']
+    assert cache.current_bytes == 8
+
+    cache.put('e', b'xxxxxx')  # 14 bytes: 'c' then 'a' go, 'd' was used more recently
+    assert [key for key in 'abcde' if key in cache] == ['d', 'e']
+    assert cache.stats()['evictions'] == 3
+    assert cache.current_bytes == 8
+
+
+def test_replacing_a_value_updates_its_size():
+    cache = LRUCache(10)
+    cache.put('a', b'xxxx')
+    cache.put('b', b'xxxx')
+    cache.put('a', b'x')  # 'a' becomes most recent and shrinks
+    cache.put('c', b'xxxxx')
+    assert len(cache) == 3 and cache.current_bytes == 10
+    cache.put('d', b'x')
+    assert 'b' not in cache and 'a' in cache
+
+
+def test_oversized_value_is_not_cached():
+    cache = LRUCache(10)
+    cache.put('a', b'xxxx')
+    assert cache.put('big', b'x' * 11) is False
+    assert 'big' not in cache and 'a' in cache
+    # Replacing an entry with an oversized value drops the old one
+    assert cache.put('a', b'x' * 11) is False
+    assert 'a' not in cache and cache.current_bytes == 0
+
+
+def test_discard_clear_and_stats():
+    cache = LRUCache(100, sizeof=lambda value: 1)
+    cache.put('a', [1, 2, 3])
+    cache.put('b', [4])
+    assert cache.get('missing', 'default') == 'default'
+    assert cache.get('a') == [1, 2, 3]
+    cache.discard('a')
+    cache.discard('a')
+    assert cache.current_bytes == 1
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 1, 0.5)
+    cache.clear()
+    assert len(cache) == 0 and cache.current_bytes == 0
+
+
+def test_prune_directory_removes_oldest_files(tmp_path):
+    for age, name in enumerate(['new.png', 'mid.png', 'old.png']):
+        path = tmp_path / name
+        path.write_bytes(b'x' * 10)
+        os.utime(path, (1000 - age * 100, 1000 - age * 100))
+    (tmp_path / 'other.txt').write_bytes(b'x' * 100)
+
+    assert prune_directory(str(tmp_path), 15, suffix='.png') == 2
+    assert sorted(os.listdir(tmp_path)) == ['new.png', 'other.txt']
@@ -0,0 +1,79 @@
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+from app.utils.file_processor import read_dataset, write_columnar_copy
+from app.utils.query_parser import FilterError, parse_attribute_filters, parse_bbox
+
+COLUMNS = ['PROVINCE', 'POPULATION', 'Name', 'area km2']
+
+
+@pytest.mark.parametrize('text, operator', [
+    ('=', '='), ('==', '='), ('is', '='),
+    ('!=', '!='), ('<>', '!='), ('is not', '!='),
+    ('>', '>'), ('>=', '>='), ('<', '<'), ('<=', '<='),
+])
+def test_operators(text, operator):
+    assert parse_attribute_filters(f"map POPULATION where POPULATION {text} 1000", COLUMNS) == [
+        ('POPULATION', operator, 1000)
+    ]
+
+
+def test_several_conditions_and_clause_end():
+    message = "Map population where province = Punjab AND population >= 2.5e3, coloured red"
+    assert parse_attribute_filters(message, COLUMNS) == [
+        ('PROVINCE', '=', 'Punjab'),
+        ('POPULATION', '>=', 2500.0),
+    ]
+
+
+def test_quoting():
+    message = "map it where Name = \"Dera Ghazi Khan\" and PROVINCE != 'Sindh'"
+    assert parse_attribute_filters(message, COLUMNS) == [
+        ('Name', '=', 'Dera Ghazi Khan'),
+        ('PROVINCE', '!=', 'Sindh'),
+    ]
+    # Quoted digits are still read as numbers; floats keep their decimals
+    assert parse_attribute_filters("where POPULATION = '12'", COLUMNS) == [('POPULATION', '=', 12)]
+    assert parse_attribute_filters("where area km2 < 3.0", COLUMNS) == [('area km2', '<', 3.0)]
+
+
+def test_unknown_columns_and_no_clause():
+    assert parse_attribute_filters("map POPULATION", COLUMNS) == []
+    assert parse_attribute_filters("where DISTRICT = Lahore and POPULATION > 5", COLUMNS) == [
+        ('POPULATION', '>', 5)
+    ]
+    assert parse_attribute_filters("where POPULATION", COLUMNS) == []
+
+
+def test_bbox():
+    assert parse_bbox("map it in bbox (74.5, 31.6, 74.2, 31.4)") == (74.2, 31.4, 74.5, 31.6)
+    assert parse_bbox("map it") is None
+
+
+@pytest.fixture(params=['geojson', 'parquet'])
+def dataset(request, tmp_path):
+    """A small layer read through OGR, or through its GeoParquet copy with filters pushed down"""
+    gdf = gpd.GeoDataFrame(
+        {'PROVINCE': ['Punjab', 'Sindh', 'Punjab'], 'POPULATION': [500, 1500, 2500]},
+        geometry=[Point(74, 31), Point(68, 25), Point(73, 33)],
+        crs='EPSG:4326',
+    )
+    path = str(tmp_path / 'districts.geojson')
+    gdf.to_file(path, driver='GeoJSON')
+    if request.param == 'parquet':
+        pytest.importorskip('pyarrow')
+        write_columnar_copy(gdf, path)
+    return path
+
+
+def test_filters_applied_by_reader(dataset):
+    where = parse_attribute_filters("where PROVINCE = Punjab and POPULATION > 1000", ['PROVINCE', 'POPULATION'])
+    gdf = read_dataset(dataset, where=where)
+    assert gdf['POPULATION'].tolist() == [2500]
+
+
+def test_word_compared_with_number_raises(dataset):
+    where = parse_attribute_filters("where POPULATION > many", ['PROVINCE', 'POPULATION'])
+    assert where == [('POPULATION', '>', 'many')]
+    with pytest.raises(FilterError):
+        read_dataset(dataset, where=where)
@@ -0,0 +1,79 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import rasterio
+from flask import Flask
+from rasterio.transform import from_origin
+from shapely.geometry import box
+from app.utils.zonal_stats import zonal_statistics
+
+HEIGHT, WIDTH, BINS = 48, 64, 256
+
+
+@pytest.fixture
+def raster(tmp_path):
+    """Two-band tiled GeoTIFF on a 1 m grid with origin (0, HEIGHT), so pixel (row, col) spans x col..col+1"""
+    rng = np.random.default_rng(7)
+    red = rng.uniform(0.05, 0.4, (HEIGHT, WIDTH)).astype(np.float32)
+    nir = rng.uniform(0.2, 0.9, (HEIGHT, WIDTH)).astype(np.float32)
+    # A pixel with no valid index value
+    red[5, 5] = nir[5, 5] = 0
+    path = str(tmp_path / 'scene.tif')
+    with rasterio.open(
+        path, 'w', driver='GTiff', width=WIDTH, height=HEIGHT, count=2, dtype='float32',
+        crs='EPSG:32643', transform=from_origin(0, HEIGHT, 1, 1), tiled=True, blockxsize=16, blockysize=16
+    ) as dst:
+        dst.write(red, 1)
+        dst.write(nir, 2)
+    return path, red.astype(np.float64), nir.astype(np.float64)
+
+
+def _pixels(x0, y0, x1, y1):
+    """Rows and columns of the pixels whose centres fall inside a grid-aligned box"""
+    return slice(HEIGHT - y1, HEIGHT - y0), slice(x0, x1)
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_matches_per_zone_numpy(raster, workers):
+    path, red, nir = raster
+    boxes = [
+        (2, 30, 20, 46),    # Contains the invalid pixel at row 5, col 5
+        (10, 20, 40, 40),   # Overlaps the first zone, and wins where they overlap
+        (100, 100, 110, 110),  # Outside the raster
+        (45, 0, 64, 48),    # Spans several windows, up to the raster edge
+    ]
+    zones = gpd.GeoDataFrame(
+        {'name': list('abcd')}, geometry=[box(*b) for b in boxes], crs='EPSG:32643', index=[10, 11, 12, 13]
+    )
+
+    app = Flask(__name__)
+    app.config.update(INDEX_CACHE_DIR=None, RASTER_WINDOW_SIZE=16, ZONAL_HISTOGRAM_BINS=BINS)
+    with app.app_context():
+        stats = zonal_statistics(path, 'NDVI', [2, 1], zones, percentiles=(10, 50, 90), workers=workers)
+
+    with np.errstate(invalid='ignore'):
+        ndvi = (nir - red) / (nir + red)
+    zone_of = np.zeros((HEIGHT, WIDTH), dtype=int)
+    for number, b in enumerate(boxes, start=1):
+        zone_of[_pixels(*b)] = number
+
+    assert list(stats.index) == [10, 11, 12, 13]
+    for number, index in enumerate(zones.index, start=1):
+        values = ndvi[(zone_of == number) & np.isfinite(ndvi)]
+        row = stats.loc[index]
+        assert row['NDVI_count'] == values.size
+        if values.size == 0:
+            assert row[['NDVI_mean', 'NDVI_std', 'NDVI_min', 'NDVI_max', 'NDVI_p50']].isna().all()
+            continue
+        assert row['NDVI_mean'] == pytest.approx(values.mean(), rel=1e-5)
+        assert row['NDVI_std'] == pytest.approx(values.std(), rel=1e-4)
+        assert row['NDVI_min'] == pytest.approx(values.min(), rel=1e-6)
+        assert row['NDVI_max'] == pytest.approx(values.max(), rel=1e-6)
+        # Percentiles come from a histogram and are accurate to within one bin
+        bin_width = (values.max() - values.min()) / BINS
+        for q in (10, 50, 90):
+            assert row[f'NDVI_p{q}'] == pytest.approx(np.percentile(values, q), abs=bin_width)
+
+    # The overlap went to the second zone, and the invalid pixel was skipped
+    assert stats.loc[10, 'NDVI_count'] == 18 * 16 - 10 * 10 - 1
+    assert stats.loc[11, 'NDVI_count'] == 30 * 20